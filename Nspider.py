@@ -1,7 +1,7 @@
 import argparse
 
 import os
-from time import sleep
+import threading
 from pathlib import Path
 
 import re
@@ -10,11 +10,21 @@ import numpy as np
 import pandas as pd
 
 
-import PyPDF2 as pypdf
-
-
 from crawling import paper_crawler
 from scraping import scraping
+from driver_pool import driver_pool
+from page_cache import page_cache
+from registry import registries
+from pipeline import pipeline, stage
+from frontier import frontier
+from resolution import resolution_memo
+from download_scheduler import download_scheduler
+from eutils import eutils
+from ratelimit import rate_limiter
+from text_extraction import text_extractor, file_hash
+from text_index import text_index
+from similarity import tfidf_index
+from telemetry import metrics, jsonl_sink, prometheus_sink
 
 from utils import *
 from utils import namespace_regrex
@@ -23,10 +33,18 @@ from utils import namespace_regrex
 class nspider():
 
     def __init__(self, working_dir, executable_path, download_path, cache_path,
-                 mode='csv', directory_polling_interval=2., directory_polling_limit=10):
+                 mode='csv', directory_polling_interval=2., directory_polling_limit=10,
+                 pool_size=2, max_pages=200, cache_max_bytes=None, direct_download=False,
+                 backend='html', eutils_api_key=None, eutils_email=None, extract_processes=None,
+                 telemetry_dir=None, per_domain_downloads=2, hedge_after=30., publisher_rate=1.):
         
         self.working_dir = Path(working_dir)
         self.working_dir.mkdir(exist_ok=True)
+
+        if telemetry_dir is not None:
+            Path(telemetry_dir).mkdir(parents=True, exist_ok=True)
+            metrics.add_sink(jsonl_sink(Path(telemetry_dir) / 'metrics.jsonl'))
+            metrics.add_sink(prometheus_sink(Path(telemetry_dir) / 'nspider.prom'))
     
         self.download_dir = self.working_dir / 'publication'
         self.download_dir.mkdir(exist_ok=True)
@@ -34,176 +52,217 @@ class nspider():
         self.database_dir = self.working_dir / 'database'
         self.database_dir.mkdir(exist_ok=True)
 
-        self.gds_path = self.database_dir / 'gds.csv'
-        self.publication_path = self.database_dir / 'publication.csv'
-        self.source_path = self.database_dir / 'source.csv'
+        if mode not in registries:
+            raise ValueError(f"Unknown storage mode: {mode}")
 
-        if self.gds_path.exists():
-            self.gds = pd.read_csv(self.gds_path)
-            self.gds_index = set(self.gds.gds_uid)
-        else:
-            self.gds = pd.DataFrame(columns=columns['gds'])
-            self.gds_index = set()
+        self.registry = registries[mode](self.database_dir)
 
-        if self.publication_path.exists():
-            self.publication = pd.read_csv(self.publication_path)
-            self.publication_index = set(self.publication.doi)
-        else:
-            self.publication = pd.DataFrame(columns=columns['publication'])
-            self.publication_index = set()
+        #job state outlives the process, so an interrupted batch resumes where it stopped.
+        self.frontier = frontier(self.working_dir / 'frontier.sqlite')
 
-        if self.source_path.exists():
-            self.source = pd.read_csv(self.source_path)
-        else:
-            self.source = pd.DataFrame(columns=columns['source'])
+        #how each gds uid was bound, including the ones nothing was found for.
+        self.resolution = resolution_memo(self.working_dir / 'resolution.sqlite')
 
-        self.scraping = scraping(executable_path, cache_path, download_path)
+        #chrome only downloads through the crawler, so the pool saves into its directory.
+        self.pool = driver_pool(executable_path, self.download_dir, size=pool_size, max_pages=max_pages)
 
-        self.crawler = paper_crawler(executable_path, str(self.download_dir), cache_path)
+        self.cache = page_cache(cache_path, ttl=cache_ttl, max_bytes=cache_max_bytes)
+
+        #one limiter for every loader, so workers share each host's budget. hosts without a rate of
+        #their own, i.e. publishers, get publisher_rate requests/s; None leaves them unpaced.
+        rates = dict(host_rates)
+        if eutils_api_key is not None:
+            rates['eutils.ncbi.nlm.nih.gov'] = 10.
+        self.limiter = rate_limiter(rates, default_rate=publisher_rate)
+
+        self.scraping = scraping(self.pool, self.cache, limiter=self.limiter)
+
+        if 'eutils' == backend:
+            self.backend = eutils(api_key=eutils_api_key, email=eutils_email, limiter=self.limiter)
+        elif 'html' == backend:
+            self.backend = self.scraping
+        else:
+            raise ValueError(f"Unknown scraping backend: {backend}")
+
+        self.crawler = paper_crawler(
+            self.pool, str(self.download_dir), self.cache, direct_download=direct_download, limiter=self.limiter
+        )
         self.directory_polling_interval = directory_polling_interval
         self.directory_polling_limit = directory_polling_limit
 
+        self._browser_download_lock = threading.Lock()
 
-    def _register_dataset(self, gds):
+        #sources are tried in order of how well their domain has done before, kept across runs.
+        self.scheduler = download_scheduler(
+            self._download_paper_and_rename, self.working_dir / 'domains.sqlite',
+            workers=pool_size, per_domain=per_domain_downloads, hedge_after=hedge_after
+        )
+
+        #text lands next to the pdf as <doi>.txt, so each pdf is parsed once.
+        self.extractor = text_extractor(workers=extract_processes)
 
-        gds_uid = set(gds.gds_uid)
-        gds_uid_registered = gds_uid & self.gds_index 
+        #accessions, pmids and title terms to dois, updated as publications come in.
+        self.index = text_index(self.working_dir / 'index.sqlite')
 
-#        assert ({*()} == gds_uid_registered), "Found duplicats."
+        #dois registered one by one, whose pdf text is indexed on the next accession search.
+        self._unindexed = set()
 
-        gds = gds[gds_uid_registered != gds.gds_uid]
-        self.gds_index |= gds_uid - gds_uid_registered
-        self.gds = pd.concat([self.gds, gds])
+        #tf-idf over registered abstracts, fit on first use and extended as publications come in.
+        self._similarity = None
+
+
+    def _register_dataset(self, gds):
+
+        self.registry.add_gds(gds)
     
 
     def _register_publication(self, publication, source, ret=None):
 
-        publication_doi = set(publication.doi)
-        publication_doi_registered = publication_doi & self.publication_index 
+        publication, source = self.registry.new_publication(publication, source)
+        publication = self._download_free_pmc(publication.copy(), source)
+
+        with metrics.timer('registry_insert_seconds'):
+            self.registry.add_publication(publication, source)
+        self._add_similarity(publication)
 
-#        assert ({*()} == publication_doi_registered), "Found duplicats."
+        #only metadata here; body text waits for the first search that needs it.
+        for doi in publication.doi:
+            self._index_publication(self.registry.publication_by('doi', doi))
+            self._unindexed.add(doi)
 
-        publication = publication[publication_doi_registered != publication.doi]
-        source = source[publication_doi_registered != source.doi]
+        return None
 
-        self.publication_index |= publication_doi - publication_doi_registered
 
-        free_pmc_links = source[source.doi.isin(publication[publication.is_free_pmc].doi)]
+    def _download_free_pmc(self, publication, source):
 
+        is_pending = publication.is_free_pmc & (True != publication.successful_donwload)
+        free_pmc_links = source[source.doi.isin(publication[is_pending].doi)]
+
+        #ncbi first, as long as no domain has a history to rank it by.
         is_free_pmc_ncbi = 'www.ncbi.nlm.nih.gov' == free_pmc_links.src_domain
-        free_pmc_ncbi = free_pmc_links[is_free_pmc_ncbi]
+        free_pmc_links = pd.concat([free_pmc_links[is_free_pmc_ncbi], free_pmc_links[~is_free_pmc_ncbi]])
 
-        for index, row in free_pmc_ncbi.iterrows():
+        saved = self.scheduler.run(free_pmc_links)
 
-            status = bool(self._download_paper_and_rename(row.doi, row.link_to_paper))
+        is_saved = publication.doi.map(lambda doi: saved.get(doi) is not None)
+        publication.loc[publication.doi.isin(saved.keys()), 'successful_donwload'] = is_saved
 
-            publication.loc[row.doi == publication.doi, 'successful_donwload'] = status
+        return publication
 
-        free_pmc_not_ncbi = free_pmc_links[~is_free_pmc_ncbi]
 
-        for doi, subset in free_pmc_not_ncbi.groupby(['doi']):
+    def _download_paper_and_rename(self, doi, link, rank=0, cancel=None):
 
-            if publication[doi == publication.doi].successful_donwload.values[0]:
-                continue
+        save_as = doi
+        save_path = self.crawler.download_path / (save_as + '.pdf')
 
-            status = False
+        #fetched by an earlier run that died before the registry was committed.
+        if ('downloaded' == self.frontier.get('pdf', link)[0]) and save_path.exists():
+            return save_path
 
-            for index, row in subset.iterrows():
+        if self.crawler.direct_download:
 
-                status = bool(self._download_paper_and_rename(row.doi, row.link_to_paper))
+            #hedged siblings of the same doi stream into their own part files.
+            stream_as = save_as if 0 == rank else f'{save_as}.{rank}'
 
-                if status:
-                    break
-                else:
-                    pass
+            saved = self.crawler.excute([link], [stream_as], browser_fallback=False, cancel=cancel)[0]
 
-            publication.loc[row.doi == publication.doi, 'successful_donwload'] = status
+            if saved is not None: #streamed straight to <doi>.pdf
+                self.crawler.watcher.ignore(save_path.name) #a hedged rename is not a new download
+                os.replace(saved, save_path)
+                self.frontier.mark('pdf', link, 'downloaded')
+                return save_path
 
-        self.publication = pd.concat([self.publication, publication])
-        self.source = pd.concat([self.source, source])
+        if (cancel is not None) and cancel.is_set():
+            return None
 
-        return None
+        #a browser download is only recognized by arriving after the mark, so they run one at a time.
+        with self._browser_download_lock:
 
+            #a sibling may have won while this one waited for the browser.
+            if (cancel is not None) and cancel.is_set():
+                return None
 
-    def _download_paper_and_rename(self, doi, link):
+            mark = self.crawler.watcher.mark()
 
-        save_as = doi
+            self.crawler.excute([link])
 
-        self.crawler.chk_new_file() #update file_list
-        curr_files = self.crawler.file_list
+            #returns as soon as chrome has finished writing the pdf.
+            with metrics.timer('download_wait_seconds'):
+                name_new_file = self.crawler.watcher.wait(
+                    mark, self.directory_polling_interval * self.directory_polling_limit, suffix='.pdf'
+                )
 
-        self.crawler.excute([link])
+            metrics.count('browser_downloads' if name_new_file is not None else 'browser_download_timeouts')
 
-        name_new_file = None
-        n_scan = 0
+            if name_new_file is not None:
+                self.crawler.watcher.ignore(save_as + '.pdf')
+                name_new_file.rename(save_path)
+                self.frontier.mark('pdf', link, 'downloaded')
 
-        while (name_new_file is None) & (self.directory_polling_limit > n_scan):
+            else:
+                self.frontier.fail('pdf', link, "no pdf arrived")
 
-            name_new_file = self.crawler.chk_new_file()
-            name_new_file = name_new_file if '.pdf' == name_new_file.suffix else None
+        return name_new_file
 
-            sleep(self.directory_polling_interval)
-            n_scan += 1
 
-        if name_new_file is not None:
-            name_new_file.rename(self.crawler.download_path / (save_as + '.pdf'))
+    def _publication_path(self, identifier):
 
-        else:
-            pass
+        publication_pdfFileObj = self.load_publication(identifier)
 
-        return name_new_file
+        if publication_pdfFileObj is None:
+            return None
 
+        publication_pdfFileObj.close()
 
-    def _get_text_from_publication(self, pmid):
-    
-        publication_text = ""
-        publication_pdfFileObj = None
+        return Path(publication_pdfFileObj.name)
 
 
-        if not pmid in self.publication.pmid:
+    def _index_publication(self, entry, path=None):
 
-            publication, source = self._get_publication_detail(search_pubmed_by_pmid, pmid)
-        
-        publication_pdfFileObj = self.load_publication(pmid)
+        for doi, pmid, title in entry[['doi', 'pmid', 'title']].values:
+            self.index.add_publication(doi, pmid, title)
 
+        if path is not None:
+            self._index_text(path)
 
-        if publication_pdfFileObj is not None:
 
-            publication_pdfReader = pypdf.PdfFileReader(publication_pdfFileObj)
-            
-            for page_number in range(publication_pdfReader.numPages):
-                pageObj = publication_pdfReader.getPage(page_number) 
-      
-                publication_text += pageObj.extractText() 
-                  
-            publication_pdfFileObj.close() 
-    
-        return publication_text
-    
+    def _index_text(self, path, text=None):
+
+        #text of an unchanged pdf is indexed once.
+        digest = file_hash(path)
+
+        if digest == self.index.digest(path.stem):
+            return
+
+        if text is None:
+            with metrics.timer('extract_seconds'):
+                text = self.extractor.extract(path)
+
+        self.index.add_text(path.stem, text, digest)
+
 
     def _get_publication_detail(self, search_pubmed_by, param):
 
         #search_pubmed_by_gds_uid
-        if param in self.gds_index:
+        if (search_pubmed_by_gds_uid == search_pubmed_by) and self.registry.has_gds(param):
 
-            doi = gds[gds_uid == gds.gds_uid].doi.squeeze()
+            doi = self.registry.doi_by_gds_uid(param)
 
-            if doi is not None:
-                publication = self.publication[doi == self.publication.doi]
-                source = self.source[doi == self.source.doi]
+            publication = self.registry.publication_by('doi', doi)
+            source = self.registry.source_by_doi(doi)
 
-            return publication.values.tolist(), source.values.tolist()
+            return publication[columns['publication']].values.tolist(), source[columns['source']].values.tolist()
 
         #search_pubmed_by_pmid
-        if param in self.publication.pmid.values:
+        if (search_pubmed_by_pmid == search_pubmed_by) and self.registry.has_pmid(param):
 
-            publication = self.publication[param == self.publication.pmid]
-            source = self.source[publication.doi.squeeze() == self.source.doi]
+            publication = self.registry.publication_by('pmid', param)
+            source = self.registry.source_by_doi(publication.doi.squeeze())
 
-            return publication.values.tolist(), source.values.tolist()
+            return publication[columns['publication']].values.tolist(), source[columns['source']].values.tolist()
 
     
-        publication, source = self.scraping.search_publication_detail(search_pubmed_by, param)
+        publication, source = self.backend.search_publication_detail(search_pubmed_by, param)
 
         if [] == publication:
             return publication, source
@@ -215,94 +274,181 @@ class nspider():
         return publication, source
 
 
+    def _mentions_accession(self, pmid, accessions, regrex_accession):
+
+        if not self.registry.has_pmid(pmid):
+            self._get_publication_detail(search_pubmed_by_pmid, pmid)
+
+        entry = self.registry.publication_by('pmid', pmid)
+
+        if 0 == len(entry):
+            return False
+
+        #cheapest first: the abstract, then the PMC html, and the pdf only when both miss.
+        if regrex_accession.search(entry.abstract.values[0] or ""):
+            return True
+
+        if entry.is_free_pmc.values[0] and regrex_accession.search(self.scraping.fetch_pmc_text(pmid)):
+            return True
+
+        doi = entry.doi.values[0]
+
+        if self.index.has_text(doi):
+            return self.index.mentions(doi, accessions)
+
+        path = self._publication_path(pmid)
+
+        if path is None:
+            return False
+
+        tail = ""
+        read = []
+        pages = self.extractor.iter_pages(path)
+
+        try:
+            for page in pages:
+                #an accession may be split across a page break.
+                if regrex_accession.search(tail + page):
+                    return True
+
+                read.append(page)
+                tail = page[-16:]
+        finally:
+            pages.close()
+
+        #read to the end anyway, so the index gets the text without a second parse.
+        self._index_text(path, text=''.join(read))
+        self._unindexed.discard(doi)
+
+        return False
+
+
+    def _add_similarity(self, publication):
+
+        #new abstracts only update the document frequencies; a registration never refits the index.
+        if (self._similarity is not None) and (0 < len(publication)):
+            self._similarity.add(publication.doi, publication.abstract)
+
+
+    def _similarity_index(self):
+
+        similarity = self._similarity
+
+        if similarity is None:
+            abstracts = self.registry.abstracts()
+            similarity = self._similarity = tfidf_index().fit(abstracts.doi, abstracts.abstract)
+
+        return similarity
+
+
     #@pysnooper.snoop()
     def _search_relative_publication_with_gds(self, uid):
 
-        pmids = self.scraping.search_relative_pmids_with_gds(uid)
+        pmids, accession_number, other_accession_number, dataset_title = self.scraping.search_relative_pmids_with_gds(uid)
 
-        for pmid in pmids:
+        if [] == pmids:
+            return None, None, False
 
-            text = self._get_text_from_publication(pmid)
+        accessions = list(dict.fromkeys([accession_number] + other_accession_number))
+        regrex_accession = re.compile(r"\b(?:%s)\b" % '|'.join(map(re.escape, accessions)))
 
-            if accession_number in text:
+        for pmid in pmids:
+
+            if self._mentions_accession(pmid, accessions, regrex_accession):
                 find_related_publication = True
                 return pmid, None, find_related_publication
 
-        similarity = []
+        abstructs = []
 
         for pmid in pmids:
 
-            abstruct = self.publication[pmid == self.publication.pmid].abstract.values[0]
-            similarity.append(similarity_fn(dataset_title, abstruct))
+            abstruct = self.registry.publication_by('pmid', pmid).abstract.values
+            abstructs.append(abstruct[0] if 0 < len(abstruct) else None)
+
+        #every candidate is scored against the title in one sparse product.
+        similarity = self._similarity_index().score(dataset_title, abstructs)
 
-        max_idx = max(range(len(similarity)), key=lambda x: similarity[x])
+        max_idx = int(np.argmax(similarity))
 
         find_related_publication = True
 
         return pmids[max_idx], similarity[max_idx], find_related_publication
 
 
+    def _bind_gds_uid(self, gds_uid, doi):
+
+        #each uid is checkpointed as soon as it is bound, so a crash loses at most the one in progress.
+        self._register_dataset(pd.DataFrame([[gds_uid, doi]], columns=columns['gds']))
+        self.frontier.mark('gds_uid', gds_uid, 'downloaded')
+
+
+    def _is_resumable(self, gds_uid):
+
+        #bound by an earlier run that died before the dataset row was stored.
+        memo = self.resolution.get(gds_uid)
+
+        if (memo is None) or (memo['doi'] is None) or (0 == len(self.registry.publication_by('doi', memo['doi']))):
+            return False
+
+        self._bind_gds_uid(gds_uid, memo['doi'])
+
+        return True
+
+
     def _register_publication_by_gds_uid(self, gds_uids):
 
-        gds = []
-        publication = []
-        source = []
-        binded = []
+        unbound = []
     
         for gds_uid in gds_uids:
-    
-            _publication, _source = self._get_publication_detail(search_pubmed_by_gds_uid, gds_uid)
 
-            if [] == _publication:
-                doi = None
-            else:
-                doi = _publication[0][0]
+            self.frontier.add('gds_uid', gds_uid)
 
-            _gds = [[gds_uid, doi]]
-     
-            if doi is None:
-                binded += [False]
-            else:
-                binded += [True]
+            #a uid that led nowhere is not searched again before its retry time, nor one out of attempts.
+            if self.resolution.is_unbound(gds_uid) or not self.frontier.is_retryable('gds_uid', gds_uid):
+                continue
 
-                gds += _gds
-                publication += _publication
-                source += _source
+            if self._is_resumable(gds_uid):
+                continue
 
-        binding_check_table = pd.DataFrame(
-            zip(gds_uids, binded, np.zeros_like(gds_uids, dtype=np.bool)), 
-            columns=['gds_uid', 'is_binded', 'find_related_publication']
-        )
+            try:
+                _publication, _source = self._get_publication_detail(search_pubmed_by_gds_uid, gds_uid)
+            except Exception as error:
+                self.frontier.fail('gds_uid', gds_uid, f"direct: {error!r}")
+                continue
+
+            if [] == _publication:
+                unbound.append(gds_uid)
+                continue
 
-        nrow = len(binding_check_table)
+            doi, pmid = _publication[0][0], _publication[0][1]
 
-        for idx in range(nrow):
+            self.resolution.put(gds_uid, doi, pmid, 'direct_link')
+            self._bind_gds_uid(gds_uid, doi)
 
-            row = binding_check_table.iloc[idx]
+        for gds_uid in unbound:
 
-            if not row.is_binded:
+            self.frontier.mark('gds_uid', gds_uid, 'fetched')
 
-                pmid, score, find_related_publication = self._search_relative_publication_with_gds(row.gds_uid)
-                
-                if find_related_publication:
+            try:
+                pmid, score, find_related_publication = self._search_relative_publication_with_gds(gds_uid)
 
-                    _publication, _source = self._get_publication_detail(search_pubmed_by_pmid, pmid)
+                _publication = []
 
-                    if [] == _publication:
-                        doi = None
-                    else:
-                        doi = _publication[0][0]
+                if find_related_publication:
+                    _publication, _source = self._get_publication_detail(search_pubmed_by_pmid, pmid)
 
-                    _gds = [[row.gds_uid, doi]]
+            except Exception as error:
+                self.frontier.fail('gds_uid', gds_uid, f"relative: {error!r}")
+                continue
 
-                    gds += _gds
-                    publication += _publication
-                    source += _source
+            if [] == _publication:
+                self.resolution.put(gds_uid, None, None, 'none')
+                continue
 
-                binding_check_table.find_related_publication.at[idx] = find_related_publication
+            doi = _publication[0][0]
 
-        gds = pd.DataFrame(gds, columns=columns['gds'])
-        self._register_dataset(gds)
+            self.resolution.put(gds_uid, doi, pmid, 'accession_hit' if score is None else 'similarity', score)
+            self._bind_gds_uid(gds_uid, doi)
 
         return None
 
@@ -319,11 +465,14 @@ class nspider():
 
         pdfFileObj = None
 
-        entry = self.publication[self.publication[type_of_identifier] == identifier]
+        entry = self.registry.publication_by(type_of_identifier, identifier)
+
+        #a csv reload leaves NaN for papers never downloaded, and NaN is truthy.
+        is_downloaded = (1 == len(entry)) and (True == entry.successful_donwload.values[0])
+        fpath = self.download_dir / (entry.doi.values[0] + '.pdf') if is_downloaded else None
 
-        if entry.successful_donwload.squeeze():
+        if is_downloaded and fpath.exists():
 
-            fpath = self.download_dir / (entry.doi.squeeze() + '.pdf')
             pdfFileObj = open(fpath, 'rb')
 
         else:
@@ -335,48 +484,255 @@ class nspider():
 
     def get_pmid_by_gds_uid(self, gds_uid):
 
-        if not gds_uid in self.gds_index:
+        if not self.registry.has_gds(gds_uid):
 
+            #_register_publication_by_gds_uid skips uids the memo knows to be unbound.
             self._register_publication_by_gds_uid([gds_uid])            
 
-        doi = self.gds[gds_uid == self.gds.gds_uid].doi.values[0]
+        doi = self.registry.doi_by_gds_uid(gds_uid)
 
-        pmid = self.publication[doi == self.publication.doi].pmid
+        pmid = self.registry.publication_by('doi', doi).pmid
 
         return pmid
 
 
+    def get_pmids_by_gds_uids(self, gds_uids, lookup_workers=4, parse_workers=2, download_workers=2, extract_workers=1, maxsize=64,
+                              return_errors=False):
+
+        if isinstance(gds_uids, (str, Path)):
+            gds_uids = read_identifiers(gds_uids)
+
+        lock = threading.Lock()
+        unbound = []
+        pmids = {}
+
+        def parsed(gds_uid, publication, source):
+            self.frontier.mark('gds_uid', gds_uid, 'parsed', {'publication': publication, 'source': source})
+
+            publication = pd.DataFrame(publication, columns=columns['publication'])
+            source = pd.DataFrame(source, columns=columns['source'])
+
+            return gds_uid, publication, source
+
+        def pending(gds_uids):
+            for gds_uid in gds_uids:
+                with lock:
+                    is_registered = self.registry.has_gds(gds_uid)
+
+                self.frontier.add('gds_uid', gds_uid)
+
+                #every uid asked for is answered, the ones failing in a stage with None.
+                pmids[gds_uid] = None
+
+                #a uid failing max_attempts times is left for the caller to look at.
+                if not (is_registered or self.resolution.is_unbound(gds_uid) or not self.frontier.is_retryable('gds_uid', gds_uid)):
+                    yield gds_uid
+
+        def lookup(gds_uid):
+            doms = self.scraping.fetch_publication_doms(search_pubmed_by_gds_uid, gds_uid)
+            self.frontier.mark('gds_uid', gds_uid, 'fetched')
+
+            return gds_uid, doms
+
+        def bulk_lookup(gds_uids):
+            details = self.backend.publication_details_by_gds_uids(gds_uids)
+
+            for gds_uid, (publication, source) in details.items():
+
+                if [] == publication:
+                    with lock:
+                        unbound.append(gds_uid)
+                    continue
+
+                yield parsed(gds_uid, publication, source)
+
+        def parse(item):
+            gds_uid, doms = item
+            publication, source = self.scraping.parse_publication_doms(doms)
+
+            if [] == publication:
+                with lock:
+                    unbound.append(gds_uid)
+                return None
+
+            return parsed(gds_uid, publication, source)
+
+        def download(item):
+            gds_uid, publication, source = item
+            doi, pmid = publication.doi.values[0], publication.pmid.values[0]
+
+            with lock:
+                publication, source = self.registry.new_publication(publication, source)
+
+            publication = self._download_free_pmc(publication.copy(), source)
+
+            with lock, metrics.timer('registry_insert_seconds'):
+                self.registry.add_publication(publication, source)
+                self._register_dataset(pd.DataFrame([[gds_uid, doi]], columns=columns['gds']))
+                self._add_similarity(publication)
+
+            self.frontier.mark('gds_uid', gds_uid, 'downloaded')
+            self.resolution.put(gds_uid, doi, pmid, 'direct_link')
+
+            return gds_uid, doi
+
+        def extract(item):
+            gds_uid, doi = item
+
+            with lock:
+                entry = self.registry.publication_by('doi', doi)
+                path = self._publication_path(doi)
+
+            self._index_publication(entry, path)
+
+            return gds_uid
+
+        if isinstance(self.backend, eutils):
+
+            #one elink and one efetch round trip answer a whole batch of uids.
+            items = chunked(pending(gds_uids), self.backend.batch_size)
+            stages = [
+                stage('lookup', bulk_lookup, lookup_workers, fan_out=True),
+            ]
+
+        else:
+
+            items = pending(gds_uids)
+            stages = [
+                stage('lookup', lookup, lookup_workers),
+                stage('parse', parse, parse_workers),
+            ]
+
+        finishing = [
+            stage('download', download, download_workers),
+            stage('extract', extract, extract_workers),
+        ]
+
+        #parsed rows of an interrupted run skip the lookup; their pdfs are not fetched twice either.
+        resumed = [
+            (gds_uid, pd.DataFrame(payload['publication'], columns=columns['publication']),
+             pd.DataFrame(payload['source'], columns=columns['source']))
+            for gds_uid, payload in self.frontier.keys_by('gds_uid', 'parsed', 'downloaded')
+            if (payload is not None) and not self.registry.has_gds(gds_uid)
+        ]
+
+        if [] != resumed:
+            self._run_jobs(finishing, resumed, maxsize)
+
+        self._run_jobs(stages + finishing, items, maxsize)
+
+        #UIDs without a direct pubmed link go through the slower relative search.
+        if [] != unbound:
+            self._register_publication_by_gds_uid(unbound)
+
+        #every uid of the batch resolved in one pass.
+        found = self.registry.lookup_many('gds_uid', list(pmids))
+        pmids.update({gds_uid: (pmid if pd.notna(pmid) else None) for gds_uid, pmid in zip(found.gds_uid, found.pmid)})
+
+        #failures of this run and of earlier ones that used up their attempts.
+        failed = self.frontier.errors('gds_uid', [gds_uid for gds_uid, pmid in pmids.items() if pmid is None])
+        errors = {gds_uid: failed[str(gds_uid)] for gds_uid in pmids if str(gds_uid) in failed}
+
+        if {} != errors:
+            print(f"{len(errors)} of {len(pmids)} gds uids failed, e.g. {next(iter(errors.items()))}")
+
+        metrics.flush()
+
+        return (pmids, errors) if return_errors else pmids
+
+
+    def _run_jobs(self, stages, items, maxsize):
+
+        jobs = pipeline(stages, maxsize)
+        done = list(jobs.run(items))
+
+        for stage_name, item, error, _ in jobs.errors:
+
+            #a bulk lookup fails for its whole chunk; later stages carry the uid first.
+            gds_uids = item if isinstance(item, list) else [item[0] if isinstance(item, tuple) else item]
+
+            for gds_uid in gds_uids:
+                self.frontier.fail('gds_uid', gds_uid, f"{stage_name}: {error!r}")
+
+        return done
+
+
     def get_gds_uid_by_pmid(self, pmid):
 
-        if not pmid in self.publication.pmid:
-            return None
+        doi = self.index.doi_by_pmid(pmid)
 
-        doi = self.publication[pmid == self.publication].doi
-        gds_uid = self.gds[doi == self.gds.doi].gds_uid
+        if doi is None:
+
+            if not self.registry.has_pmid(pmid):
+                return None
+
+            doi = self.registry.publication_by('pmid', pmid).doi.squeeze()
+
+        gds_uid = self.registry.gds_uids_by_doi(doi)
 
         return gds_uid
 
 
+    def _index_pending(self):
+
+        pending, self._unindexed = self._unindexed, set()
+
+        for doi in sorted(pending):
+
+            path = self._publication_path(doi)
+
+            if path is not None:
+                self._index_text(path)
+
+
+    def get_dois_by_accession(self, accession):
+
+        self._index_pending()
+
+        return self.index.dois_by('accession', accession)
+
+
+    def get_similar_publications(self, texts, k=10):
+
+        #a list of texts, e.g. titles of many datasets, is matched in one product.
+        is_single = isinstance(texts, str)
+        results = self._similarity_index().top_k([texts] if is_single else texts, k)
+
+        return results[0] if is_single else results
+
+
+    def update_index(self):
+
+        #picks up pdfs that arrived outside of the batch api, e.g. from an older run.
+        for path in sorted(self.download_dir.glob('*.pdf')):
+
+            entry = self.registry.publication_by('doi', path.stem)
+
+            self._index_publication(entry, path)
+
+
     def commit(self):
 
-        self.gds.to_csv(self.gds_path)
-        self.publication.to_csv(self.publication_path)
-        self.source.to_csv(self.source_path)
+        with metrics.timer('registry_commit_seconds'):
+            self.registry.commit()
+
+
+    def report(self):
+
+        metrics.flush()
+
+        return metrics.summary()
   
     
 
 if __name__ == '__main__':
-    import shutil
-    
-    shutil.rmtree('./work/publication/')
-    shutil.rmtree('./work/database/')
-    os.mkdir('./work/publication/')
 
     spider = nspider('./work', "/home/bioinfo-lab/Downloads/chromedriver_linux64/chromedriver", 'download/', 'cache/', directory_polling_interval=5., directory_polling_limit=10)
     print(spider.get_pmid_by_gds_uid('200011474'))
 #    print(spider.get_pmid_by_gds_uid('200030845'))
 
     spider.commit()
+    print(spider.report())
 
     del spider
 
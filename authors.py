@@ -0,0 +1,64 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+
+regrex_initials = re.compile(r"^[A-Z]{1,4}$")
+
+
+def author_key(name):
+
+    #"Müller-Li JA." -> ('muller-li', 'JA'). pubmed and GEO both write surname first.
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(character for character in name if not unicodedata.combining(character))
+    parts = name.replace('.', '').split()
+
+    if [] == parts:
+        return None
+
+    if (1 < len(parts)) and regrex_initials.match(parts[-1]):
+        return ' '.join(parts[:-1]).casefold(), parts[-1]
+
+    return ' '.join(parts).casefold(), ''
+
+
+def is_compatible(initials, other):
+    return initials.startswith(other) or other.startswith(initials)
+
+
+class author_index():
+
+    def __init__(self, contributors):
+
+        #longer initials first, so a precise name claims its author before a vague one can.
+        self.keys = sorted(
+            [key for key in map(author_key, contributors) if key is not None],
+            key=lambda key: len(key[1]), reverse=True
+        )
+
+
+    def match(self, authers):
+
+        by_surname = defaultdict(list)
+
+        for key in map(author_key, authers):
+            if key is not None:
+                by_surname[key[0]].append(key[1])
+
+        #every contributor needs an author of its own; lookups go by surname only.
+        for surname, initials in self.keys:
+
+            candidates = by_surname.get(surname, [])
+
+            for idx, other in enumerate(candidates):
+                if is_compatible(initials, other):
+                    candidates.pop(idx)
+                    break
+            else:
+                return False
+
+        return True
+
+
+    def match_all(self, authers_list):
+        return [idx for idx, authers in enumerate(authers_list) if self.match(authers)]
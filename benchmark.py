@@ -0,0 +1,247 @@
+import argparse
+
+import io
+import time
+import shutil
+import timeit
+import tempfile
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager, redirect_stdout
+
+import requests
+from lxml import html
+
+from extractors import extract_publication
+from page_cache import page_cache
+from scraping import scraping
+from crawling import paper_crawler
+from telemetry import metrics
+
+from utils import namespace_regrex, regrex_pmid, search_pubmed_by_gds_uid
+
+
+def cssselect_publication(dom):
+
+    #what scraping did before extractors: every selector translated on every call.
+    try:
+        doi = dom.cssselect(".rprtid")[0].xpath('//a[re:test(@href, "(?i)(doi.org/*)")]', namespaces=namespace_regrex)[0].text.replace('/', '_slash')
+        pmid = regrex_pmid.findall(dom.cssselect(".aux")[0].text_content())[0]
+    except IndexError:
+        return None
+
+    abstract = dom.cssselect(".abstr > div > p")
+    title = dom.cssselect(".abstract > h1")
+
+    return {
+        'doi': doi,
+        'pmid': pmid,
+        'is_free_pmc': [] != dom.cssselect(".status_icon"),
+        'title': title[0].text if [] != title else None,
+        'abstract': abstract[0].text if [] != abstract else None,
+        'links_to_paper': [element.attrib['href'] for element in dom.cssselect(".portlet > a")],
+    }
+
+
+def load_pages(cache_path):
+
+    #the pages shipped in cache/ are raw html, one file per url.
+    pages = {}
+
+    for path in sorted(Path(cache_path).iterdir()):
+        if path.is_file() and not path.name.startswith('index.sqlite'):
+            pages[path.name] = path.read_text(encoding='utf-8', errors='replace')
+
+    return pages
+
+
+def bench_extractors(pages, number):
+
+    print(f"{'page':64} {'cssselect':>10} {'compiled':>10} {'speedup':>8}  same")
+
+    for name, src in pages.items():
+
+        dom = html.fromstring(src.replace("&nbsp;",""))
+
+        legacy = timeit.timeit(lambda: cssselect_publication(dom), number=number) / number
+        compiled = timeit.timeit(lambda: extract_publication(dom), number=number) / number
+
+        is_same = (cssselect_publication(dom) == extract_publication(dom))
+
+        print(f"{name[:64]:64} {legacy * 1e3:8.3f}ms {compiled * 1e3:8.3f}ms {legacy / compiled:7.1f}x  {is_same}")
+
+
+class counting_cache():
+
+    def __init__(self, cache):
+
+        self.cache = cache
+        self.pages = 0
+
+
+    def get(self, url):
+
+        self.pages += 1
+
+        return self.cache.get(url)
+
+
+    def put(self, url, src, status=None):
+        pass
+
+
+class replay_driver():
+
+    #serves cached pages where chrome would load them.
+    def __init__(self, cache):
+
+        self.cache = cache
+        self.page_source = None
+        self.current_url = None
+
+
+    def get(self, url):
+
+        src = self.cache.get(url)
+
+        if src is None:
+            raise KeyError(f"offline replay: {url} is not cached")
+
+        self.page_source = src
+        self.current_url = url
+
+
+    def execute_script(self, script):
+        return 0
+
+
+class replay_pool():
+
+    size = 1
+
+    def __init__(self, cache):
+        self.driver = replay_driver(cache)
+
+
+    @contextmanager
+    def borrow(self, driver=None):
+        yield self.driver if driver is None else driver
+
+
+class offline_session():
+
+    def get(self, url, **kwargs):
+        raise requests.ConnectionError(f"offline replay: {url} is not cached")
+
+
+    def close(self):
+        pass
+
+
+def replays(cache_path, work_dir):
+
+    cache = counting_cache(page_cache(cache_path))
+    pool = replay_pool(cache)
+
+    scraper = scraping(pool, cache)
+    scraper.http_loader.session = offline_session()
+
+    crawler = paper_crawler(pool, work_dir, cache)
+    crawler.session = offline_session()
+
+    #each stage comes with the check that it extracted something; selectors that stop matching the
+    #cached markup otherwise time an empty pass.
+    return cache, [
+        ('search_publication_detail', lambda: scraper.search_publication_detail(search_pubmed_by_gds_uid, '200011474'),
+         lambda result: [] != result[0]),
+        ('search_relative_pmids_with_gds', lambda: scraper.search_relative_pmids_with_gds('200030845'),
+         lambda result: [] != result[0]),
+        ('get_link_xpath_pdf', lambda: crawler.get_link_xpath_pdf(
+            crawler.get_dom("http://www.pnas.org/cgi/pmidlookup?view=long&pmid=18650386"), pool.driver
+        ), bool),
+    ]
+
+
+def bench_replay(cache_path, number):
+
+    print(f"{'stage':32} {'mean':>9} {'p50':>9} {'max':>9} {'pages/s':>9} {'peak':>9}  result")
+
+    failed = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+
+        #the legacy pages are imported into the indexed layout on first read, so work on a copy.
+        replay_cache = Path(work_dir) / 'cache'
+        shutil.copytree(cache_path, replay_cache, ignore=shutil.ignore_patterns('index.sqlite*'))
+
+        cache, stages = replays(replay_cache, work_dir)
+
+        for name, replay, is_valid in stages:
+
+            try:
+                with redirect_stdout(io.StringIO()):
+                    result = replay() #warm up: imports the pages and compiles regexes
+            except Exception as error:
+                print(f"{name:32} failed: {error!r}")
+                failed.append(name)
+                continue
+
+            if not is_valid(result):
+                print(f"{name:32} failed: extracted no rows, the selectors do not match the cached pages: {str(result)[:40]}")
+                failed.append(name)
+                continue
+
+            latencies = []
+            cache.pages = 0
+
+            with redirect_stdout(io.StringIO()):
+                for _ in range(number):
+                    start = time.perf_counter()
+                    result = replay()
+                    latencies.append(time.perf_counter() - start)
+
+            #measured apart from the timings, tracemalloc slows everything it traces.
+            tracemalloc.start()
+            with redirect_stdout(io.StringIO()):
+                replay()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            latencies.sort()
+            mean = sum(latencies) / number
+
+            print(
+                f"{name:32} {mean * 1e3:7.2f}ms {latencies[number // 2] * 1e3:7.2f}ms {latencies[-1] * 1e3:7.2f}ms "
+                f"{cache.pages / sum(latencies):9.1f} {peak / 2 ** 20:7.2f}MB  {str(result)[:40]}"
+            )
+
+    #the same counters and timers a real run reports.
+    print()
+    print(metrics.summary())
+
+    return failed
+
+
+def get_args():
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--cache_path", default="./cache", type=str)
+    parser.add_argument("--number", default=200, type=int, help="runs per page or stage")
+    parser.add_argument("--suite", default="all", choices=['all', 'extractors', 'replay'])
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    if args.suite in ('all', 'extractors'):
+        bench_extractors(load_pages(args.cache_path), args.number)
+
+    if args.suite in ('all', 'replay'):
+        failed = bench_replay(args.cache_path, args.number)
+
+        if [] != failed:
+            raise SystemExit(f"replay stages failed: {', '.join(failed)}")
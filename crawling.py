@@ -3,32 +3,129 @@ import argparse
 import os
 from pathlib import Path
 from functools import partial
+from urllib.parse import urlsplit
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
 import re
 from lxml import html
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver import Chrome, ChromeOptions
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.common.action_chains import ActionChains
 
 import pandas as pd
 
 import sidekit
+from driver_pool import driver_pool
+from page_cache import page_cache
+from download_watcher import download_watcher
+from ratelimit import rate_limiter, backoff, retry_after, retry_status
+from utils import host_rates
+from extractors import selectors
+from telemetry import metrics
 
 
 import os
 
-_ns = {'re': 'http://exslt.org/regular-expressions'}
+
+def stream_pdf(session, url, save_path, headers=None, cookies=None, chunk_size=1 << 16, remain=3, cancel=None, limiter=None):
+
+    save_path = Path(save_path)
+    part_path = save_path.with_name(save_path.name + '.part')
+    limiter = limiter if limiter is not None else rate_limiter()
+
+    with metrics.timer('pdf_stream_seconds', host=urlsplit(url).netloc):
+        saved = _stream_pdf(session, url, save_path, part_path, headers, cookies, chunk_size, remain, cancel, limiter)
+
+    metrics.count('pdf_streamed' if saved is not None else 'pdf_stream_failed')
+
+    return saved
+
+
+def _stream_pdf(session, url, save_path, part_path, headers, cookies, chunk_size, remain, cancel, limiter):
+
+    for attempt in range(remain + 1):
+
+        limiter.acquire(url)
+
+        #resume what an earlier attempt left behind.
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        range_header = {'Range': 'bytes=%d-' % offset} if 0 < offset else {}
+
+        try:
+            with session.get(url, headers={**(headers or {}), **range_header}, cookies=cookies, stream=True, timeout=30.) as response:
+
+                if 416 == response.status_code: #part file is already complete
+                    break
+
+                if (response.status_code in retry_status) and (attempt < remain):
+                    limiter.penalize(url, retry_after(response.headers, backoff(attempt)))
+                    continue
+
+                response.raise_for_status()
+
+                content_type = response.headers.get('Content-Type', '')
+                if ('pdf' not in content_type) & ('octet-stream' not in content_type):
+                    #an earlier part of the same url is no pdf either, and must not be resumed.
+                    part_path.unlink(missing_ok=True)
+                    return None
+
+                if 206 != response.status_code:
+                    offset = 0
+
+                with open(part_path, 'ab' if 0 < offset else 'wb') as part_file:
+                    for chunk in response.iter_content(chunk_size):
+                        if (cancel is not None) and cancel.is_set():
+                            break
+                        part_file.write(chunk)
+
+                #a cancelled sibling leaves nothing behind to resume.
+                if (cancel is not None) and cancel.is_set():
+                    part_path.unlink(missing_ok=True)
+                    return None
+
+        except requests.RequestException:
+            if attempt == remain:
+                return None
+
+            sleep(backoff(attempt))
+
+        else:
+            break
+
+    with open(part_path, 'rb') as part_file:
+        is_pdf = (b'%PDF-' == part_file.read(5))
+
+    if not is_pdf:
+        part_path.unlink()
+        return None
+
+    os.replace(part_path, save_path)
+
+    return save_path
 
 
 class paper_crawler():
 
-    def __init__(self, executable_path, download_path, cache_path):
+    def __init__(self, pool, download_path, cache, direct_download=False, limiter=None, time_out=10.):
 
         self.download_path = Path(download_path)
-        self.driver = self.make_driver(executable_path, download_path)
-        self.html_loader = sidekit.page_source(self.driver, cache_path)
+        self.pool = pool
+        self.limiter = limiter if limiter is not None else rate_limiter()
+        self.time_out = time_out
+        self.html_loader = sidekit.page_source(pool, cache, limiter=self.limiter)
+
+        self.direct_download = direct_download
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool.size, pool_maxsize=pool.size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
         self.by_domain_pdf_link_getter = {
 
@@ -87,75 +184,61 @@ class paper_crawler():
 
         self.regrex_search_domain = re.compile(r"(?<=https://)[\.\w]+")
 
-        self.file_list = set(self.download_path.glob('*'))
-
-        
-    def make_driver(self, executable_path=None, download_path=None):
+        self.watcher = download_watcher(self.download_path)
 
-        mime_types_pdf = "application/pdf,application/vnd.adobe.xfdf,application/vnd.fdf,application/vnd.adobe.xdp+xml, application/octet-stream"
         
-        options = ChromeOptions()
-        options.add_argument('--kiosk')
-        options.add_argument('--kiosk-printing')
-        options.add_argument("--disable-extensions")
-        options.add_argument('--headless')
-
-        prefs = {
-            "download.default_directory" :  download_path, 
-            "download.prompt_for_download": False,
-            "download.directory_upgrade": True,
-            "safebrowsing.enabled": True
-        }
-        options.add_experimental_option("prefs", prefs)
-
-        driver = Chrome(
-            executable_path=executable_path,
-            chrome_options=options
-        )
-        driver.set_window_position(0, 0)
-        driver.set_window_size(1024, 768)
+    def get_link_xpath_trip(self, dom, driver, orderd_xpath_list):
 
-        return driver
+        #each click only waits until the next element shows up.
+        for xpath, next_xpath in zip(orderd_xpath_list[:-1], orderd_xpath_list[1:]):
+            driver.find_element(By.XPATH, xpath).click()
+            WebDriverWait(driver, self.time_out).until(
+                expected_conditions.presence_of_element_located((By.XPATH, next_xpath))
+            )
 
+        return driver.find_element(By.XPATH, orderd_xpath_list[-1]).get_attribute('href')
 
-    def chk_new_file(self):
 
-        curr_file_list = set(self.download_path.glob('*'))
-        new_file = curr_file_list - self.file_list
-        new_file = new_file.pop() if not {*()} == new_file else ''
-        new_file = Path(new_file)
+    def get_link_xpath_pdf(self, dom, driver=None):
+        return selectors['pdf_links'](dom)[0].attrib['href']
 
-        self.file_list = curr_file_list
 
-        return new_file #example: PosixPath('download/pone.0118832.pdf')
+    def save_publication(self, url_to_publication, driver):
+        mark = self.watcher.mark()
+        driver.get(url_to_publication)
 
+        already_new_pdf_downloaded = self.watcher.activity_since(mark)
+        
+        if not already_new_pdf_downloaded:
+            ActionChains(driver).send_keys(Keys.CONTROL,'p').perform()
 
-    def get_link_xpath_trip(self, dom, orderd_xpath_list):
 
-        if 1 < len(orderd_xpath_list):
-            for xpath in orderd_xpath_list[:-1]:
-                self.html_loader.driver.find_element_by_xpath(xpath).click()
-                sleep(5)
+    def browser_identity(self, driver):
 
-        return self.html_loader.driver.find_element_by_xpath(orderd_xpath_list[-1]).get_attribute('href')
+        #reuse the browser identity so that publishers accept the request.
+        headers = {
+            'User-Agent': driver.execute_script("return navigator.userAgent;"),
+            'Referer': driver.current_url,
+        }
+        cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
 
+        return headers, cookies
 
-    def get_link_xpath_pdf(self, dom):
-        return dom.xpath('//*[re:test(@href, ".*.pdf")]', namespaces=_ns)[0].attrib['href']
 
+    def stream_publication(self, url_to_publication, save_as, identity, cancel=None):
 
-    def save_publication(self, url_to_publication):
-        self.driver.get(url_to_publication)
+        headers, cookies = identity
+        save_path = self.download_path / (save_as + '.pdf')
+        self.watcher.ignore(save_path.name)
 
-        already_new_pdf_downloaded = bool(self.chk_new_file())
-        
-        if not already_new_pdf_downloaded:
-            self.html_loader.actions.send_keys(Keys.CONTROL,'p').perform()
+        return stream_pdf(
+            self.session, url_to_publication, save_path, headers=headers, cookies=cookies, cancel=cancel, limiter=self.limiter
+        )
 
 
-    def get_dom(self, query, param='', domain=''):
-        src = self.html_loader.get(domain + query%tuple(param), use_cache=False)
-        sleep(3.)
+    def get_dom(self, query, param='', domain='', driver=None):
+        #pacing is left to the limiter, per host.
+        src = self.html_loader.get(domain + query%tuple(param), use_cache=False, driver=driver)
         dom = html.fromstring(src.replace("&nbsp;",""))
 
         return dom
@@ -166,14 +249,14 @@ class paper_crawler():
         return latest_file
 
 
-    def excute(self, urls):
+    def _excute_one(self, url, save_as=None, browser_fallback=True, cancel=None):
 
-        for url in urls:
-            dom = self.get_dom(url)
-            curr_url = self.driver.current_url
+        with self.pool.borrow() as driver:
+            dom = self.get_dom(url, driver=driver)
+            curr_url = driver.current_url
             domain = self.regrex_search_domain.findall(curr_url)[0]
 
-            pdf_link = self.by_domain_pdf_link_getter[domain](dom)
+            pdf_link = self.by_domain_pdf_link_getter[domain](dom, driver)
 
             is_full_link = bool(re.search(domain, pdf_link))
 
@@ -183,7 +266,42 @@ class paper_crawler():
                 url_to_publication = 'https://' + domain + pdf_link
 
             print(url_to_publication)
-            self.save_publication(url_to_publication)
+
+            is_streamed = self.direct_download & (save_as is not None)
+
+            if is_streamed:
+                identity = self.browser_identity(driver)
+            elif browser_fallback:
+                self.save_publication(url_to_publication, driver)
+
+        if not is_streamed:
+            return None
+
+        #the browser goes back to the pool first; a pdf takes far longer to stream than its page to load.
+        saved = self.stream_publication(url_to_publication, save_as, identity, cancel=cancel)
+
+        if (saved is None) and browser_fallback:
+            with self.pool.borrow() as driver:
+                self.save_publication(url_to_publication, driver)
+
+        return saved
+
+
+    def excute(self, urls, save_as=None, browser_fallback=True, cancel=None):
+
+        save_as = [None] * len(urls) if save_as is None else save_as
+        excute_one = partial(self._excute_one, browser_fallback=browser_fallback, cancel=cancel)
+
+        if (1 < len(urls)) & (1 < self.pool.size):
+
+            with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+                saved = list(executor.map(excute_one, urls, save_as))
+
+        else:
+
+            saved = [excute_one(url, name) for url, name in zip(urls, save_as)]
+
+        return saved
 
 
 
@@ -197,6 +315,10 @@ def get_args():
     parser.add_argument("--download_path", default="./", type=str)
     parser.add_argument("--cache_path", default="./cache", type=str)
     parser.add_argument("--driver_path", default="C:/toolkit/bin/geckodriver.exe", type=str)
+    parser.add_argument("--pool_size", default=2, type=int)
+    parser.add_argument("--direct_download", action='store_true')
+    parser.add_argument("--name_column", default="doi", type=str, help="names the streamed pdfs, <download_path>/<name>.pdf")
+    parser.add_argument("--rate", default=None, type=float, help="requests/s per publisher host")
     
     return parser.parse_args()
 
@@ -210,8 +332,22 @@ if __name__ == '__main__':
     args = get_args()
     init(args)
 
-    links_csv = pd.read_csv(args.links_csv)[args.column].to_list()[1:]
-    crawler = paper_crawler(args.driver_path, args.download_path, args.cache_path)
+    links = pd.read_csv(args.links_csv)
+    links_csv = links[args.column].to_list()[1:]
+
+    #pdfs are only streamed when they have a name to be saved under.
+    save_as = None
+
+    if args.direct_download:
+        if args.name_column not in links:
+            raise ValueError(f"--direct_download needs a name column, {args.name_column} is not in {args.links_csv}")
+
+        save_as = [str(name).replace('/', '_slash') for name in links[args.name_column].to_list()[1:]]
+
+    pool = driver_pool(args.driver_path, args.download_path, size=args.pool_size)
+    cache = page_cache(args.cache_path)
+    limiter = rate_limiter(host_rates, default_rate=args.rate)
+    crawler = paper_crawler(pool, args.download_path, cache, direct_download=args.direct_download, limiter=limiter)
 
-    crawler.excute(links_csv)
+    crawler.excute(links_csv, save_as)
 
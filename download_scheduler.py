@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+from time import perf_counter
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from telemetry import metrics
+
+
+class domain_stats():
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS domain (
+            src_domain TEXT PRIMARY KEY,
+            attempts INTEGER NOT NULL,
+            successes INTEGER NOT NULL,
+            seconds REAL NOT NULL
+        )""",
+    ]
+
+    def __init__(self, path):
+
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self.connection:
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+        self.domains = {
+            src_domain: [attempts, successes, seconds]
+            for src_domain, attempts, successes, seconds in self.connection.execute("SELECT * FROM domain")
+        }
+
+
+    def record(self, src_domain, is_success, seconds):
+
+        with self._lock:
+            stats = self.domains.setdefault(src_domain, [0, 0, 0.])
+            stats[0] += 1
+            stats[1] += int(is_success)
+            stats[2] += seconds
+
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO domain VALUES (?, ?, ?, ?)", (src_domain, *stats))
+
+
+    def rank(self, src_domain):
+
+        attempts, successes, seconds = self.domains.get(src_domain, [0, 0, 0.])
+
+        #laplace smoothing: an unseen domain starts at 1/2, ahead of domains that keep failing.
+        success_rate = (successes + 1) / (attempts + 2)
+        mean_seconds = seconds / attempts if 0 < attempts else 0.
+
+        return -success_rate, mean_seconds
+
+
+class download_scheduler():
+
+    def __init__(self, attempt, stats_path, workers=4, per_domain=2, hedge_after=30.):
+
+        #attempt(doi, link, rank, cancel) returns the saved path or None.
+        self.attempt = attempt
+        self.stats = domain_stats(stats_path)
+        self.per_domain = per_domain
+        self.hedge_after = hedge_after
+
+        self.dois = ThreadPoolExecutor(max_workers=workers)
+        self.attempts = ThreadPoolExecutor(max_workers=workers * per_domain)
+
+        self.slots = defaultdict(lambda: threading.Semaphore(per_domain))
+        self._lock = threading.Lock()
+
+
+    def _slot(self, src_domain):
+
+        with self._lock:
+            return self.slots[src_domain]
+
+
+    def _attempt(self, doi, src_domain, link, rank, cancel):
+
+        with self._slot(src_domain):
+
+            if cancel.is_set(): #a sibling won while this one waited for its slot
+                return None
+
+            start = perf_counter()
+
+            #a source that breaks, e.g. a domain without a pdf link getter, is only a failed source.
+            try:
+                saved = self.attempt(doi, link, rank, cancel)
+            except Exception as error:
+                print(f"download failed: {link}: {error!r}")
+                metrics.count('download_errors', host=src_domain, error=type(error).__name__)
+                saved = None
+
+            elapsed = perf_counter() - start
+
+        #a cancelled attempt says nothing about its domain.
+        if (saved is not None) or not cancel.is_set():
+            self.stats.record(src_domain, saved is not None, elapsed)
+            metrics.observe('download_seconds', elapsed, host=src_domain, result='saved' if saved is not None else 'failed')
+
+        return saved
+
+
+    def _resolve(self, doi, candidates):
+
+        cancel = threading.Event()
+        pending = []
+        saved = None
+
+        for rank, (src_domain, link) in enumerate(candidates):
+
+            pending.append(self.attempts.submit(self._attempt, doi, src_domain, link, rank, cancel))
+
+            #the next source starts once this one fails, or hedges when it is slower than hedge_after.
+            finished, _ = wait(pending, timeout=self.hedge_after, return_when=FIRST_COMPLETED)
+
+            saved = next((future.result() for future in finished if future.result() is not None), None)
+            pending = [future for future in pending if future not in finished]
+
+            if saved is not None:
+                break
+
+        while (saved is None) and ([] != pending):
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending = list(pending)
+            saved = next((future.result() for future in finished if future.result() is not None), None)
+
+        #siblings still streaming stop at their next chunk.
+        cancel.set()
+
+        return saved
+
+
+    def run(self, links):
+
+        candidates = defaultdict(list)
+
+        for doi, src_domain, link_to_paper in links[['doi', 'src_domain', 'link_to_paper']].values:
+            candidates[doi].append((src_domain, link_to_paper))
+
+        #sorted is stable, so domains without history keep the order they were given in.
+        futures = {
+            doi: self.dois.submit(self._resolve, doi, sorted(sources, key=lambda source: self.stats.rank(source[0])))
+            for doi, sources in candidates.items()
+        }
+
+        return {doi: future.result() for doi, future in futures.items()}
+
+
+    def close(self):
+
+        self.dois.shutdown()
+        self.attempts.shutdown()
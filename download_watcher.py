@@ -0,0 +1,180 @@
+import os
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from time import sleep, monotonic
+from collections import Counter
+from pathlib import Path
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+_event_header = struct.Struct('iIII')
+
+#chrome writes into these and renames them once the download has finished.
+partial_suffixes = ('.crdownload', '.part', '.tmp')
+
+
+def _inotify_init(directory):
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+
+    if 0 > fd:
+        return None
+
+    wd = libc.inotify_add_watch(fd, str(directory).encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+
+    if 0 > wd:
+        os.close(fd)
+        return None
+
+    return fd
+
+
+class download_watcher():
+
+    def __init__(self, directory, polling_interval=.25):
+
+        self.directory = Path(directory)
+        self.polling_interval = polling_interval
+
+        self.events = [] #[(name, is_complete)], in arrival order
+        self.claimed = set() #positions in events, so a name can be downloaded again once renamed
+        self.ignored = Counter() #names whose next completed event is one of ours
+        self._lock = threading.Lock()
+
+        self.fd = _inotify_init(self.directory)
+        self.known = {entry.name for entry in os.scandir(self.directory)}
+
+
+    def _is_partial(self, name):
+        return name.endswith(partial_suffixes)
+
+
+    def _append(self, name, is_complete):
+
+        if is_complete and (0 < self.ignored[name]):
+            self.ignored[name] -= 1
+            self.claimed.add(len(self.events))
+
+        self.events.append((name, is_complete))
+
+
+    def _read_inotify(self, timeout):
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if [] == readable:
+            return
+
+        try:
+            buffer = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+
+        offset = 0
+
+        while offset < len(buffer):
+            wd, mask, cookie, length = _event_header.unpack_from(buffer, offset)
+            offset += _event_header.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode()
+            offset += length
+
+            is_complete = bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)) and not self._is_partial(name)
+            self._append(name, is_complete)
+
+
+    def _read_directory(self, timeout):
+
+        sleep(min(timeout, self.polling_interval))
+
+        current = {entry.name for entry in os.scandir(self.directory)}
+
+        for name in current - self.known:
+            self._append(name, not self._is_partial(name))
+
+        self.known = current
+
+
+    def _wait_readable(self, timeout):
+
+        #runs without the lock, so ignore() and mark() are never held up by a waiter.
+        if self.fd is None:
+            sleep(min(timeout, self.polling_interval))
+            return
+
+        try:
+            select.select([self.fd], [], [], timeout)
+        except (OSError, ValueError): #closed meanwhile
+            pass
+
+
+    def _drain(self, timeout):
+
+        if self.fd is not None:
+            self._read_inotify(timeout)
+        else:
+            self._read_directory(timeout)
+
+
+    def mark(self):
+
+        with self._lock:
+            self._drain(0)
+            return len(self.events)
+
+
+    def activity_since(self, mark):
+
+        with self._lock:
+            self._drain(0)
+            return len(self.events) > mark
+
+
+    def wait(self, mark, timeout, suffix='.pdf'):
+
+        deadline = monotonic() + timeout
+
+        while True:
+
+            with self._lock:
+
+                self._drain(0)
+
+                for position in range(mark, len(self.events)):
+                    name, is_complete = self.events[position]
+
+                    if is_complete and name.endswith(suffix) and (position not in self.claimed):
+                        self.claimed.add(position)
+                        return self.directory / name
+
+                remain = deadline - monotonic()
+
+                if 0 >= remain:
+                    return None
+
+            self._wait_readable(min(remain, 1.))
+
+
+    def ignore(self, name):
+
+        #files we create ourselves, e.g. renaming a download, are not new downloads.
+        #only the next completed event of the name is skipped, so the name stays usable afterwards.
+        with self._lock:
+            self._drain(0)
+            self.ignored[name] += 1
+
+
+    def close(self):
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,165 @@
+import queue
+import threading
+from time import monotonic
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver import Chrome, ChromeOptions
+from selenium.webdriver.chrome.service import Service
+
+
+def make_driver(executable_path=None, download_path=None):
+
+    mime_types_pdf = "application/pdf,application/vnd.adobe.xfdf,application/vnd.fdf,application/vnd.adobe.xdp+xml, application/octet-stream"
+
+    options = ChromeOptions()
+    options.add_argument('--kiosk')
+    options.add_argument('--kiosk-printing')
+    options.add_argument("--disable-extensions")
+    options.add_argument('--headless')
+
+    prefs = {
+        "download.default_directory" :  download_path,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+    options.add_experimental_option("prefs", prefs)
+
+    #selenium 4 takes the chromedriver path through a Service; without one it finds a driver itself.
+    driver = Chrome(
+        service=Service(executable_path) if executable_path is not None else Service(),
+        options=options
+    )
+    driver.set_window_position(0, 0)
+    driver.set_window_size(1024, 768)
+
+    return driver
+
+
+class driver_pool():
+
+    def __init__(self, executable_path, download_path, size=2, max_pages=200):
+
+        self.executable_path = executable_path
+        self.download_path = str(download_path)
+        self.size = size
+        self.max_pages = max_pages
+
+        self._idle = [] #most recently released last
+        self._n_pages = {}
+        self._n_started = 0
+        self._lock = threading.Lock()
+
+        #signalled whenever a driver is released or discarded, so waiters see the freed room.
+        self._available = threading.Condition(self._lock)
+
+
+    def _start(self):
+
+        driver = make_driver(self.executable_path, self.download_path)
+
+        with self._lock:
+            self._n_pages[driver] = 0
+
+        return driver
+
+
+    def _discard(self, driver):
+
+        with self._available:
+            self._n_pages.pop(driver, None)
+            self._n_started -= 1
+            self._available.notify()
+
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+
+    def _is_healthy(self, driver):
+
+        try:
+            driver.current_url
+        except WebDriverException:
+            return False
+
+        return True
+
+
+    def acquire(self, timeout=None):
+
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+
+            with self._available:
+
+                while ([] == self._idle) and (self.size <= self._n_started):
+                    remain = None if deadline is None else deadline - monotonic()
+
+                    if (remain is not None) and (0 >= remain):
+                        raise queue.Empty
+
+                    self._available.wait(remain)
+
+                #chrome starts lazily, only when every running driver is busy.
+                driver = self._idle.pop() if [] != self._idle else None
+
+                if driver is None:
+                    self._n_started += 1
+
+            if driver is None:
+                try:
+                    return self._start()
+                except:
+                    with self._available:
+                        self._n_started -= 1
+                        self._available.notify()
+                    raise
+
+            if self._is_healthy(driver):
+                return driver
+
+            self._discard(driver)
+
+
+    def release(self, driver):
+
+        with self._available:
+            self._n_pages[driver] += 1
+            is_worn = (self.max_pages <= self._n_pages[driver])
+
+            if not is_worn:
+                self._idle.append(driver)
+                self._available.notify()
+
+        #a worn driver frees its slot through _discard, which wakes a waiter to start a new one.
+        if is_worn:
+            self._discard(driver)
+
+
+    @contextmanager
+    def borrow(self, driver=None):
+
+        #already borrowed by the caller.
+        if driver is not None:
+            yield driver
+            return
+
+        driver = self.acquire()
+
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+
+    def close(self):
+
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for driver in idle:
+            self._discard(driver)
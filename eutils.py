@@ -0,0 +1,208 @@
+from time import sleep
+from datetime import date
+from urllib.parse import urlsplit
+
+import requests
+from lxml import etree
+
+from utils import *
+from ratelimit import rate_limiter, backoff, retry_after, retry_status
+
+
+def _text(element):
+    return None if element is None else ''.join(element.itertext())
+
+
+def parse_elink(root, linkname='gds_pubmed'):
+
+    links = {}
+
+    for linkset in root.iter('LinkSet'):
+        from_uid = linkset.findtext('IdList/Id')
+        links[from_uid] = [link.text for link in linkset.iterfind(f"LinkSetDb[LinkName='{linkname}']/Link/Id")]
+
+    return links
+
+
+def parse_prlinks(root):
+
+    provider_links = {}
+
+    for idurlset in root.iter('IdUrlSet'):
+        url = idurlset.findtext('ObjUrl/Url')
+
+        if url is not None:
+            provider_links[idurlset.findtext('Id')] = url
+
+    return provider_links
+
+
+def _pmc_release(article):
+
+    #embargoed articles carry the day their PMC copy opens in the history.
+    released = article.find("PubmedData/History/PubMedPubDate[@PubStatus='pmc-release']")
+
+    if released is None:
+        return None
+
+    return date(int(released.findtext('Year')), int(released.findtext('Month') or 1), int(released.findtext('Day') or 1))
+
+
+def parse_efetch(root, provider_links={}, today=None):
+
+    today = date.today() if today is None else today
+
+    publication = []
+    source = []
+
+    for article in root.iter('PubmedArticle'):
+
+        pmid = article.findtext('MedlineCitation/PMID')
+
+        doi = article.findtext("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+        doi = doi or article.findtext("MedlineCitation/Article/ELocationID[@EIdType='doi']")
+
+        if doi is None: #the html backend can not register these either
+            continue
+
+        doi = doi.replace('/', '_slash')
+
+        #free the way the html backend's status icon is: in PMC, and past any embargo.
+        pmc = article.findtext("PubmedData/ArticleIdList/ArticleId[@IdType='pmc']")
+        pmc_release = _pmc_release(article)
+        is_free_pmc = (pmc is not None) and ((pmc_release is None) or (pmc_release <= today))
+
+        title = _text(article.find('MedlineCitation/Article/ArticleTitle'))
+
+        abstruct = ' '.join(_text(element) for element in article.iterfind('MedlineCitation/Article/Abstract/AbstractText'))
+        abstruct = abstruct or None
+
+        publication.append([doi, pmid, is_free_pmc, title, abstruct, None])
+
+        #same order as the LinkOut portlet: publisher first, then PMC.
+        links_to_paper = [provider_links[pmid]] if pmid in provider_links else []
+
+        if is_free_pmc:
+            links_to_paper.append(domain + pmc_article_by_pmid % pmid)
+
+        for link_to_paper in links_to_paper:
+            source.append([doi, urlsplit(link_to_paper).netloc, link_to_paper])
+
+    return publication, source
+
+
+class eutils():
+
+    def __init__(self, api_key=None, email=None, tool='nspider', batch_size=200, limiter=None, remain=3):
+
+        self.session = requests.Session()
+        self.batch_size = batch_size
+
+        self.params = {'tool': tool}
+        if email is not None:
+            self.params['email'] = email
+        if api_key is not None:
+            self.params['api_key'] = api_key
+
+        #NCBI allows 3 requests/s, or 10 with an api key.
+        rate = 10. if api_key is not None else 3.
+        self.limiter = limiter if limiter is not None else rate_limiter({urlsplit(eutils_base).netloc: rate})
+        self.remain = remain
+
+
+    def _request(self, endpoint, **params):
+
+        url = eutils_base + endpoint
+
+        for attempt in range(self.remain + 1):
+            self.limiter.acquire(url)
+
+            try:
+                #POST, so that a batch of 200 ids never hits the url length limit.
+                response = self.session.post(url, data={**self.params, **params}, timeout=60.)
+            except requests.RequestException:
+                if attempt == self.remain:
+                    raise
+
+                sleep(backoff(attempt))
+                continue
+
+            if (response.status_code in retry_status) and (attempt < self.remain):
+                self.limiter.penalize(url, retry_after(response.headers, backoff(attempt)))
+                continue
+
+            break
+
+        response.raise_for_status()
+
+        return etree.fromstring(response.content)
+
+
+    def pmids_by_gds_uids(self, gds_uids):
+
+        links = {}
+
+        #one id parameter per uid, so elink answers with one LinkSet per uid.
+        for chunk in chunked([str(gds_uid) for gds_uid in gds_uids], self.batch_size):
+            root = self._request('elink.fcgi', dbfrom='gds', db='pubmed', linkname='gds_pubmed', id=chunk)
+            links.update(parse_elink(root))
+
+        return links
+
+
+    def _provider_links(self, pmids):
+
+        root = self._request('elink.fcgi', dbfrom='pubmed', cmd='prlinks', id=pmids)
+
+        return parse_prlinks(root)
+
+
+    def publication_details(self, pmids):
+
+        publication = []
+        source = []
+
+        for chunk in chunked(list(dict.fromkeys(pmids)), self.batch_size):
+
+            provider_links = self._provider_links(chunk)
+            root = self._request('efetch.fcgi', db='pubmed', retmode='xml', id=','.join(chunk))
+
+            _publication, _source = parse_efetch(root, provider_links)
+
+            publication += _publication
+            source += _source
+
+        return publication, source
+
+
+    def publication_details_by_gds_uids(self, gds_uids):
+
+        links = self.pmids_by_gds_uids(gds_uids)
+        publication, source = self.publication_details([pmid for pmids in links.values() for pmid in pmids])
+
+        publication_by_pmid = {row[1]: row for row in publication}
+        source_by_doi = {}
+
+        for row in source:
+            source_by_doi.setdefault(row[0], []).append(row)
+
+        details = {}
+
+        for gds_uid in gds_uids:
+            _publication = [publication_by_pmid[pmid] for pmid in links.get(str(gds_uid), []) if pmid in publication_by_pmid]
+            _source = [row for doi in dict.fromkeys(row[0] for row in _publication) for row in source_by_doi.get(doi, [])]
+
+            details[gds_uid] = (_publication, _source)
+
+        return details
+
+
+    def search_publication_detail(self, search_pubmed_by, param):
+
+        if search_pubmed_by_gds_uid == search_pubmed_by:
+            return self.publication_details_by_gds_uids([param])[param]
+
+        if search_pubmed_by_pmid == search_pubmed_by:
+            return self.publication_details([param])
+
+        raise AttributeError("E-utilities backend searches only by gds uid or pmid.")
@@ -0,0 +1,73 @@
+from lxml import etree
+from lxml.cssselect import CSSSelector
+
+from utils import namespace_regrex, regrex_pmid
+
+
+#selectors are translated and compiled once, at import, instead of on every call.
+def _css(selector, suffix=''):
+    return etree.XPath(CSSSelector(selector, translator='html').path + suffix, namespaces=namespace_regrex)
+
+
+def _xpath(path):
+    return etree.XPath(path, namespaces=namespace_regrex)
+
+
+selectors = {
+    #pubmed search results
+    'abstract_page': _css('.abstr'),
+    'result_links': _css('.rprt > .title > a'),
+
+    #gds search and GEO accession
+    'accession_number': _css('.rprtid > dd'),
+    'dataset_title': _css('.title > a'),
+    'contributor_links': _xpath('//a/@href'),
+
+    #pubmed search by contributor
+    'descriptions': _css('.rprt .desc'),
+    'details': _css('.rprt .details'),
+    'titles': _css('.rprt .title a'),
+
+    #publisher pages
+    'pdf_links': _xpath('//*[re:test(@href, ".*.pdf")]'),
+}
+
+
+#pubmed abstract page. the doi is looked up inside the first .rprtid only, not across the whole document.
+_doi = _css('.rprtid', '[1]//a[re:test(@href, "(?i)(doi.org/*)")]')
+_aux = _css('.aux')
+_status_icon = _css('.status_icon')
+_abstract = _css('.abstr > div > p')
+_title = _css('.abstract > h1')
+_links = _css('.portlet > a', '/@href')
+
+
+def _first_text(xpath, dom):
+
+    found = xpath(dom)
+
+    return found[0].text if [] != found else None
+
+
+def extract_publication(dom):
+
+    #pages without a doi or pmid can not be registered, so the remaining fields are skipped.
+    doi = _doi(dom)
+
+    if [] == doi:
+        return None
+
+    aux = _aux(dom)
+    pmid = regrex_pmid.findall(aux[0].text_content()) if [] != aux else []
+
+    if [] == pmid:
+        return None
+
+    return {
+        'doi': doi[0].text.replace('/', '_slash'),
+        'pmid': pmid[0],
+        'is_free_pmc': [] != _status_icon(dom),
+        'title': _first_text(_title, dom),
+        'abstract': _first_text(_abstract, dom),
+        'links_to_paper': [str(link) for link in _links(dom)],
+    }
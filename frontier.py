@@ -0,0 +1,138 @@
+import json
+import time
+import sqlite3
+import threading
+
+
+states = ['pending', 'fetched', 'parsed', 'downloaded', 'failed']
+
+
+class frontier():
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS job (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            payload TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (kind, key)
+        )""",
+        "CREATE INDEX IF NOT EXISTS job_state ON job (kind, state)",
+    ]
+
+    def __init__(self, path, max_attempts=3):
+
+        self.path = path
+        self.max_attempts = max_attempts
+
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+
+        #every transition is committed at once, so WAL keeps them cheap.
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        with self.connection:
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+
+    def add(self, kind, key):
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO job (kind, key, state, updated_at) VALUES (?, ?, 'pending', ?)",
+                (kind, str(key), time.time())
+            )
+
+
+    def get(self, kind, key):
+
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT state, payload, attempts FROM job WHERE kind = ? AND key = ?", (kind, str(key))
+            ).fetchone()
+
+        if row is None:
+            return None, None, 0
+
+        state, payload, attempts = row
+
+        return state, (None if payload is None else json.loads(payload)), attempts
+
+
+    def mark(self, kind, key, state, payload=None):
+
+        if state not in states:
+            raise ValueError(f"Unknown job state: {state}")
+
+        #a payload is kept until a later state brings a new one.
+        with self._lock, self.connection:
+            self.connection.execute(
+                """INSERT INTO job (kind, key, state, payload, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (kind, key) DO UPDATE SET
+                    state = excluded.state, payload = COALESCE(excluded.payload, job.payload),
+                    error = NULL, updated_at = excluded.updated_at""",
+                (kind, str(key), state, None if payload is None else json.dumps(payload), time.time())
+            )
+
+
+    def fail(self, kind, key, error):
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                """INSERT INTO job (kind, key, state, attempts, error, updated_at) VALUES (?, ?, 'failed', 1, ?, ?)
+                ON CONFLICT (kind, key) DO UPDATE SET
+                    state = 'failed', attempts = job.attempts + 1, error = excluded.error, updated_at = excluded.updated_at""",
+                (kind, str(key), str(error), time.time())
+            )
+
+
+    def is_retryable(self, kind, key):
+
+        state, _, attempts = self.get(kind, key)
+
+        return ('failed' != state) or (attempts < self.max_attempts)
+
+
+    def keys_by(self, kind, *states):
+
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT key, payload FROM job WHERE kind = ? AND state IN ({', '.join('?' * len(states))})",
+                (kind, *states)
+            ).fetchall()
+
+        return [(key, None if payload is None else json.loads(payload)) for key, payload in rows]
+
+
+    def errors(self, kind, keys):
+
+        keys = [str(key) for key in keys]
+        found = {}
+
+        #sqlite limits the number of bound parameters.
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                found.update(self.connection.execute(
+                    f"SELECT key, error FROM job WHERE kind = ? AND state = 'failed' AND key IN ({', '.join('?' * len(chunk))})",
+                    (kind, *chunk)
+                ).fetchall())
+
+        return found
+
+
+    def stats(self):
+
+        with self._lock:
+            rows = self.connection.execute("SELECT kind, state, COUNT(*) FROM job GROUP BY kind, state").fetchall()
+
+        return {(kind, state): count for kind, state, count in rows}
+
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,324 @@
+import os
+import re
+import gzip
+import time
+import codecs
+import hashlib
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+#naming of the flat cache files written before the index existed.
+symbol = re.compile("[^一-龥ぁ-んァ-ンa-xA-Z0-9_]")
+
+
+class page_cache():
+
+    def __init__(self, root, compression='gzip', legacy=True, ttl=(), max_bytes=None):
+
+        if ('zstd' == compression) & (zstandard is None):
+            raise ImportError("zstd compression requires the zstandard package.")
+
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self.compression = compression
+        self.legacy = legacy
+        self.ttl = [(re.compile(pattern), seconds) for pattern, seconds in ttl] #first match wins
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+
+        self.index = sqlite3.connect(str(self.root / 'index.sqlite'), check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("""
+            CREATE TABLE IF NOT EXISTS page (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                status INTEGER,
+                codec TEXT,
+                accessed_at REAL
+            )
+        """)
+
+        #indexes created before eviction existed have no access time.
+        if 'accessed_at' not in [column[1] for column in self.index.execute("PRAGMA table_info(page)")]:
+            self.index.execute("ALTER TABLE page ADD COLUMN accessed_at REAL")
+            self.index.execute("UPDATE page SET accessed_at = fetched_at")
+
+        self.index.execute("CREATE INDEX IF NOT EXISTS page_accessed_at ON page (accessed_at)")
+
+        #flat files already imported or found expired. they stay on disk, e.g. the pages shipped in cache/.
+        self.index.execute("CREATE TABLE IF NOT EXISTS legacy (name TEXT PRIMARY KEY, url TEXT NOT NULL, imported_at REAL NOT NULL)")
+        self.index.commit()
+
+        self.total_bytes = self.index.execute("SELECT COALESCE(SUM(size), 0) FROM page").fetchone()[0]
+
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+    def _path(self, key):
+        return self.root / key[:2] / key[2:4] / key
+
+
+    def _ttl_of(self, url):
+
+        for pattern, seconds in self.ttl:
+            if pattern.search(url):
+                return seconds
+
+        return None
+
+
+    def _is_expired(self, url, fetched_at, now):
+
+        ttl = self._ttl_of(url)
+
+        return (ttl is not None) and (now > fetched_at + ttl)
+
+
+    def _remove(self, key, size):
+
+        #caller holds self._lock
+        self.index.execute("DELETE FROM page WHERE key = ?", (key,))
+        self.total_bytes -= size
+
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+    def _evict(self, max_bytes):
+
+        #caller holds self._lock
+        n_evicted = 0
+
+        while max_bytes < self.total_bytes:
+
+            victims = self.index.execute(
+                "SELECT key, size FROM page ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+
+            if [] == victims:
+                break
+
+            for key, size in victims:
+                self._remove(key, size)
+                n_evicted += 1
+
+                if max_bytes >= self.total_bytes:
+                    break
+
+        return n_evicted
+
+
+    def _encode(self, src, codec):
+
+        data = src.encode('utf-8')
+
+        if 'gzip' == codec:
+            data = gzip.compress(data)
+        elif 'zstd' == codec:
+            data = zstandard.ZstdCompressor().compress(data)
+
+        return data
+
+
+    def _decode(self, data, codec):
+
+        if 'gzip' == codec:
+            data = gzip.decompress(data)
+        elif 'zstd' == codec:
+            data = zstandard.ZstdDecompressor().decompress(data)
+
+        return data.decode('utf-8')
+
+
+    def _get_legacy(self, url):
+
+        name = re.sub(symbol, "", url)
+        file_path = self.root / name
+
+        if not file_path.is_file():
+            return None
+
+        #a flat file is read once: it can not outlive its ttl through a reimport, and another
+        #url that strips to the same name is not served this page.
+        with self._lock:
+            imported = self.index.execute(
+                "INSERT OR IGNORE INTO legacy (name, url, imported_at) VALUES (?, ?, ?)", (name, url, time.time())
+            ).rowcount
+            self.index.commit()
+
+        if 0 == imported:
+            return None
+
+        mtime = file_path.stat().st_mtime
+
+        if self._is_expired(url, mtime, time.time()):
+            return None
+
+        file_proxy = codecs.open(file_path, 'r', 'UTF-8')
+        src = file_proxy.read()
+        file_proxy.close()
+
+        self.put(url, src, fetched_at=mtime)
+
+        return src
+
+
+    def get(self, url):
+
+        key = self._key(url)
+        now = time.time()
+
+        with self._lock:
+            entry = self.index.execute("SELECT url, codec, fetched_at, size FROM page WHERE key = ?", (key,)).fetchone()
+
+            if (entry is not None) and (url == entry[0]) and self._is_expired(url, entry[2], now):
+                self._remove(key, entry[3])
+                self.index.commit()
+                return None
+
+            if (entry is not None) and (url == entry[0]):
+                self.index.execute("UPDATE page SET accessed_at = ? WHERE key = ?", (now, key))
+                self.index.commit()
+
+        #the stored url is compared as well, so a hash collision is a miss, never a wrong page.
+        if (entry is None) or (url != entry[0]):
+            return self._get_legacy(url) if self.legacy else None
+
+        try:
+            data = self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+        return self._decode(data, entry[1])
+
+
+    def put(self, url, src, status=None, fetched_at=None):
+
+        key = self._key(url)
+        file_path = self._path(key)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        data = self._encode(src, self.compression)
+
+        tmp_path = file_path.with_suffix('.tmp%d' % threading.get_ident())
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, file_path)
+
+        now = time.time()
+
+        with self._lock:
+            replaced = self.index.execute("SELECT size FROM page WHERE key = ?", (key,)).fetchone()
+            self.total_bytes += len(data) - (0 if replaced is None else replaced[0])
+
+            self.index.execute(
+                "INSERT OR REPLACE INTO page (key, url, fetched_at, size, status, codec, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, now if fetched_at is None else fetched_at, len(data), status, self.compression, now)
+            )
+
+            if self.max_bytes is not None:
+                self._evict(self.max_bytes)
+
+            self.index.commit()
+
+
+    def __contains__(self, url):
+
+        with self._lock:
+            entry = self.index.execute("SELECT url FROM page WHERE key = ?", (self._key(url),)).fetchone()
+
+        return (entry is not None) and (url == entry[0])
+
+
+    def stats(self):
+
+        with self._lock:
+            n_entries, oldest, newest = self.index.execute(
+                "SELECT COUNT(*), MIN(fetched_at), MAX(fetched_at) FROM page"
+            ).fetchone()
+            by_status = self.index.execute(
+                "SELECT status, COUNT(*) FROM page GROUP BY status"
+            ).fetchall()
+
+        now = time.time()
+
+        return {
+            'entries': n_entries,
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'oldest_age': None if oldest is None else now - oldest,
+            'newest_age': None if newest is None else now - newest,
+            'by_status': dict(by_status),
+        }
+
+
+    def prune(self, max_bytes=None):
+
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        now = time.time()
+        n_expired = 0
+
+        with self._lock:
+
+            if [] != self.ttl:
+                for key, url, fetched_at, size in self.index.execute(
+                    "SELECT key, url, fetched_at, size FROM page"
+                ).fetchall():
+                    if self._is_expired(url, fetched_at, now):
+                        self._remove(key, size)
+                        n_expired += 1
+
+            n_evicted = 0 if max_bytes is None else self._evict(max_bytes)
+
+            self.index.commit()
+
+        return {'expired': n_expired, 'evicted': n_evicted, 'bytes': self.total_bytes}
+
+
+    def close(self):
+        self.index.close()
+
+
+def get_args():
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("cache_path", type=str)
+    parser.add_argument("command", choices=['stats', 'prune'])
+    parser.add_argument("--max_bytes", default=None, type=int)
+    parser.add_argument("--ttl", default=[], action='append', type=str, help="PATTERN=SECONDS, repeatable")
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    ttl = [(pattern, float(seconds)) for pattern, seconds in (rule.rsplit('=', 1) for rule in args.ttl)]
+    cache = page_cache(args.cache_path, ttl=ttl, max_bytes=args.max_bytes)
+
+    if 'stats' == args.command:
+        result = cache.stats()
+    else:
+        result = cache.prune()
+
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    cache.close()
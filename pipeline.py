@@ -0,0 +1,109 @@
+import queue
+import threading
+import traceback
+from time import perf_counter
+
+from telemetry import metrics
+
+
+_done = object()
+
+
+class stage():
+
+    def __init__(self, name, fn, workers=1, fan_out=False):
+
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.fan_out = fan_out #fn returns several items for the next stage
+
+
+class pipeline():
+
+    def __init__(self, stages, maxsize=64):
+
+        self.stages = stages
+        self.maxsize = maxsize
+        self.errors = []
+        self._lock = threading.Lock()
+
+
+    def _work(self, stage, inbox, outbox, n_alive, n_next):
+
+        while True:
+
+            item = inbox.get()
+
+            if item is _done:
+                break
+
+            start = perf_counter()
+
+            try:
+                results = stage.fn(item)
+                results = list(results) if stage.fan_out else [results]
+            except Exception as error:
+                metrics.count('stage_errors', stage=stage.name)
+                with self._lock:
+                    self.errors.append((stage.name, item, error, traceback.format_exc()))
+                continue
+            finally:
+                metrics.observe('stage_seconds', perf_counter() - start, stage=stage.name)
+
+            #None drops the item from the rest of the pipeline.
+            for result in results:
+                if result is not None:
+                    outbox.put(result)
+
+        #the last worker of a stage closes the next queue.
+        with self._lock:
+            n_alive[0] -= 1
+            is_last = (0 == n_alive[0])
+
+        if is_last:
+            for _ in range(n_next):
+                outbox.put(_done)
+
+
+    def run(self, items):
+
+        #bounded queues give back-pressure, so a fast stage never runs far ahead of a slow one.
+        queues = [queue.Queue(self.maxsize) for _ in range(len(self.stages) + 1)]
+        threads = []
+
+        for idx, stage in enumerate(self.stages):
+
+            n_next = self.stages[idx + 1].workers if idx + 1 < len(self.stages) else 1
+            n_alive = [stage.workers]
+
+            for _ in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(stage, queues[idx], queues[idx + 1], n_alive, n_next), daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            try:
+                for item in items:
+                    queues[0].put(item)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_done)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+
+        while True:
+            result = queues[-1].get()
+
+            if result is _done:
+                break
+
+            yield result
+
+        feeder.join()
+
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,104 @@
+import random
+import threading
+from time import sleep, monotonic
+from urllib.parse import urlsplit
+
+
+#statuses worth retrying after a pause.
+retry_status = (429, 500, 502, 503, 504)
+
+
+def backoff(attempt, base=1., cap=60.):
+
+    #exponential backoff with full jitter.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(headers, default):
+
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return default
+
+
+class token_bucket():
+
+    def __init__(self, rate, burst=1.):
+
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = monotonic()
+        self._lock = threading.Lock()
+
+
+    def _refill(self):
+
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def acquire(self, tokens=1.):
+
+        #tokens may go negative: each caller reserves its slot and sleeps outside the lock.
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if 0 > self.tokens else 0.
+
+        if 0 < wait:
+            sleep(wait)
+
+        return wait
+
+
+    def penalize(self, seconds):
+
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.) - seconds * self.rate
+
+
+class rate_limiter():
+
+    def __init__(self, rates=None, default_rate=None, burst=1.):
+
+        self.rates = dict(rates or {}) #requests/s per host
+        self.default_rate = default_rate #None means no limit
+        self.burst = burst
+
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+
+    def _bucket(self, url):
+
+        host = urlsplit(url).netloc or url
+
+        with self._lock:
+
+            if host not in self.buckets:
+                rate = self.rates.get(host, self.default_rate)
+                self.buckets[host] = None if rate is None else token_bucket(rate, self.burst)
+
+            return self.buckets[host]
+
+
+    def acquire(self, url):
+
+        bucket = self._bucket(url)
+
+        return 0. if bucket is None else bucket.acquire()
+
+
+    def penalize(self, url, seconds):
+
+        #holds back every worker on the host, not just the one that was told to slow down.
+        bucket = self._bucket(url)
+
+        if bucket is not None:
+            bucket.penalize(seconds)
+        else:
+            sleep(seconds)
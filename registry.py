@@ -0,0 +1,519 @@
+import os
+import sqlite3
+from collections import defaultdict
+
+import pandas as pd
+
+from utils import columns
+
+
+#identifiers are kept as text, like the params given to nspider.
+dtypes = {'gds_uid': str, 'pmid': str, 'doi': str}
+
+
+class csv_registry():
+
+    tables = ['gds', 'publication', 'source']
+    keys = {'gds': ['gds_uid'], 'publication': ['doi'], 'source': ['doi', 'link_to_paper']}
+    suffix = 'csv'
+
+    def __init__(self, database_dir, compact_every=20):
+
+        self.database_dir = database_dir
+        self.compact_every = compact_every
+        self.n_commits = 0
+        self.seq = 0
+
+        self.gds = self._read('gds')
+        self.publication = self._read('publication')
+        self.source = self._read('source')
+
+        self.committed = {table: len(getattr(self, table)) for table in self.tables}
+
+        self.gds_index = set(self.gds.gds_uid)
+        self.publication_index = set(self.publication.doi)
+
+        self._build_lookups()
+
+
+    def _build_lookups(self):
+
+        #point lookups go through dicts; the frames stay the storage. rows are kept as positions.
+        self.doi_by_gds = {}
+        self.gds_by_doi = defaultdict(list)
+        self.publication_rows = {}
+        self.doi_by_pmid = {}
+        self.source_rows = defaultdict(list)
+
+        self._index_gds(self.gds, 0)
+        self._index_publication(self.publication, 0)
+        self._index_source(self.source, 0)
+
+
+    def _index_gds(self, gds, offset):
+
+        for gds_uid, doi in zip(gds.gds_uid, gds.doi):
+            self.doi_by_gds[gds_uid] = doi
+
+            if pd.notna(doi):
+                self.gds_by_doi[doi].append(gds_uid)
+
+
+    def _index_publication(self, publication, offset):
+
+        for position, (doi, pmid) in enumerate(zip(publication.doi, publication.pmid), offset):
+            self.publication_rows[doi] = position
+
+            if pd.notna(pmid):
+                self.doi_by_pmid.setdefault(pmid, doi)
+
+
+    def _index_source(self, source, offset):
+
+        for position, doi in enumerate(source.doi, offset):
+            self.source_rows[doi].append(position)
+
+
+    def _path(self, table):
+        return self.database_dir / f'{table}.{self.suffix}'
+
+
+    def _segments(self, table):
+        return sorted(self.database_dir.glob(f'{table}.*.{self.suffix}'))
+
+
+    def _read_part(self, part, table):
+
+        dtype = {column: dtypes[column] for column in columns[table] if column in dtypes}
+
+        #usecols drops the index column older versions wrote as 'Unnamed: 0'.
+        return pd.read_csv(part, dtype=dtype, usecols=columns[table])
+
+
+    def _write_part(self, frame, path):
+
+        with open(path, 'w', newline='') as file_proxy:
+            frame.to_csv(file_proxy, index=False)
+            file_proxy.flush()
+            os.fsync(file_proxy.fileno())
+
+
+    def _read(self, table):
+
+        segments = self._segments(table)
+        parts = [path for path in [self._path(table)] if path.exists()] + segments
+
+        if [] == parts:
+            return pd.DataFrame(columns=columns[table])
+
+        for segment in segments:
+            self.seq = max(self.seq, int(segment.suffixes[0][1:]) + 1)
+
+        frame = pd.concat([self._read_part(part, table) for part in parts], ignore_index=True)
+
+        #a crash during compaction can leave rows both in the base file and in a segment.
+        return frame.drop_duplicates(subset=self.keys[table], ignore_index=True)
+
+
+    def _write(self, frame, path):
+
+        tmp_path = path.with_name(path.name + '.tmp')
+
+        self._write_part(frame[columns[path.name.split('.')[0]]], tmp_path)
+
+        os.replace(tmp_path, path)
+
+
+    def has_gds(self, gds_uid):
+        return gds_uid in self.gds_index
+
+
+    def has_publication(self, doi):
+        return doi in self.publication_index
+
+
+    def has_pmid(self, pmid):
+        return pmid in self.doi_by_pmid
+
+
+    def new_publication(self, publication, source):
+
+        is_new = ~publication.doi.isin(self.publication_index)
+
+        return publication[is_new], source[source.doi.isin(publication[is_new].doi)]
+
+
+    def add_gds(self, gds):
+
+        gds = gds[~gds.gds_uid.isin(self.gds_index)]
+
+        self.gds_index |= set(gds.gds_uid)
+        self._index_gds(gds, len(self.gds))
+        self.gds = pd.concat([self.gds, gds], ignore_index=True)
+
+
+    def add_publication(self, publication, source):
+
+        publication, source = self.new_publication(publication, source)
+
+        self.publication_index |= set(publication.doi)
+        self._index_publication(publication, len(self.publication))
+        self._index_source(source, len(self.source))
+        self.publication = pd.concat([self.publication, publication], ignore_index=True)
+        self.source = pd.concat([self.source, source], ignore_index=True)
+
+
+    def doi_by_gds_uid(self, gds_uid):
+        return self.doi_by_gds.get(gds_uid)
+
+
+    def gds_uids_by_doi(self, doi):
+        return pd.Series(self.gds_by_doi.get(doi, []), name='gds_uid', dtype=object)
+
+
+    def publication_by(self, type_of_identifier, identifier):
+
+        if 'pmid' == type_of_identifier:
+            type_of_identifier, identifier = 'doi', self.doi_by_pmid.get(identifier)
+
+        if 'doi' == type_of_identifier:
+            position = self.publication_rows.get(identifier)
+            return self.publication.iloc[[] if position is None else [position]]
+
+        return self.publication[identifier == self.publication[type_of_identifier]]
+
+
+    def source_by_doi(self, doi):
+        return self.source.iloc[self.source_rows.get(doi, [])]
+
+
+    def lookup_many(self, type_of_identifier, identifiers):
+
+        #one dict probe per id inside Series.map, instead of one frame scan per id.
+        frame = pd.DataFrame({type_of_identifier: pd.Series(list(identifiers), dtype=object)})
+
+        if 'gds_uid' == type_of_identifier:
+            frame['doi'] = frame.gds_uid.map(self.doi_by_gds)
+        elif 'pmid' == type_of_identifier:
+            frame['doi'] = frame.pmid.map(self.doi_by_pmid)
+        elif 'doi' != type_of_identifier:
+            raise AttributeError("Invalid identifier format.")
+
+        if 'gds_uid' != type_of_identifier:
+            frame['gds_uid'] = frame.doi.map(lambda doi: self.gds_by_doi[doi][0] if pd.notna(doi) and (doi in self.gds_by_doi) else None)
+
+        if 'pmid' != type_of_identifier:
+            pmids = self.publication.pmid.values
+            frame['pmid'] = frame.doi.map(lambda doi: pmids[self.publication_rows[doi]] if doi in self.publication_rows else None)
+
+        return frame[['gds_uid', 'doi', 'pmid']]
+
+
+    def abstracts(self):
+        return self.publication[['doi', 'abstract']]
+
+
+    def compact(self):
+
+        for table in self.tables:
+            self._write(getattr(self, table), self._path(table))
+
+        for table in self.tables:
+            for segment in self._segments(table):
+                segment.unlink()
+
+            self.committed[table] = len(getattr(self, table))
+
+        self.seq = 0
+
+
+    def commit(self):
+
+        self.n_commits += 1
+
+        if 0 == self.n_commits % self.compact_every:
+            self.compact()
+            return
+
+        #sources and publications land before gds, so a committed gds row never points at a missing doi.
+        for table in ['source', 'publication', 'gds']:
+
+            frame = getattr(self, table)
+            new_rows = frame.iloc[self.committed[table]:]
+
+            if 0 == len(new_rows):
+                continue
+
+            self._write(new_rows, self.database_dir / f'{table}.{self.seq:06d}.{self.suffix}')
+            self.committed[table] = len(frame)
+
+        self.seq += 1
+
+
+class parquet_registry(csv_registry):
+
+    suffix = 'parquet'
+    lazy_columns = ['title', 'abstract']
+
+    def __init__(self, database_dir, compact_every=20):
+
+        is_new = not any(database_dir.glob('*.parquet'))
+        self.text_loaded = set()
+
+        super().__init__(database_dir, compact_every)
+
+        #carry over a database kept in csv mode, which may be nothing but segments before its first compaction.
+        if is_new and any(database_dir.glob('*.csv')):
+            legacy = csv_registry(database_dir)
+
+            self.gds, self.publication, self.source = legacy.gds, legacy.publication, legacy.source
+            self.gds_index, self.publication_index = legacy.gds_index, legacy.publication_index
+            self.text_loaded = set(self.publication.doi)
+            self._build_lookups()
+
+            self.compact()
+
+
+    def _read_part(self, part, table):
+
+        #title and abstract stay on disk until a lookup needs them.
+        usecols = [column for column in columns[table] if ('publication' != table) or (column not in self.lazy_columns)]
+
+        frame = pd.read_parquet(part, columns=usecols).reindex(columns=columns[table])
+
+        #columns left out are all NaN floats; text has to fit in them later.
+        return frame.astype({column: object for column in columns[table] if column not in usecols})
+
+
+    def _write_part(self, frame, path):
+
+        with open(path, 'wb') as file_proxy:
+            frame.to_parquet(file_proxy, index=False)
+            file_proxy.flush()
+            os.fsync(file_proxy.fileno())
+
+
+    def _load_text(self, dois):
+
+        dois = list(dois)
+
+        if [] == dois:
+            return
+
+        parts = [path for path in [self._path('publication')] if path.exists()] + self._segments('publication')
+        text = pd.concat(
+            [pd.read_parquet(part, columns=['doi'] + self.lazy_columns, filters=[('doi', 'in', dois)]) for part in parts],
+            ignore_index=True
+        ).drop_duplicates('doi').set_index('doi')
+
+        is_target = self.publication.doi.isin(text.index).values
+
+        for column in self.lazy_columns:
+            self.publication.loc[is_target, column] = self.publication.loc[is_target, 'doi'].map(text[column]).values
+
+        self.text_loaded |= set(dois)
+
+
+    def add_publication(self, publication, source):
+
+        super().add_publication(publication, source)
+        self.text_loaded |= set(publication.doi)
+
+
+    def publication_by(self, type_of_identifier, identifier):
+
+        entry = super().publication_by(type_of_identifier, identifier)
+        not_loaded = set(entry.doi) - self.text_loaded
+
+        if {*()} != not_loaded:
+            self._load_text(not_loaded)
+            entry = super().publication_by(type_of_identifier, identifier)
+
+        return entry
+
+
+    def abstracts(self):
+
+        self._load_text(set(self.publication.doi) - self.text_loaded)
+
+        return super().abstracts()
+
+
+    def compact(self):
+
+        #the base file is rewritten, so every text column has to be in memory first.
+        self._load_text(set(self.publication.doi) - self.text_loaded)
+
+        super().compact()
+
+
+class sqlite_registry():
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS gds (
+            gds_uid TEXT PRIMARY KEY,
+            doi TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS publication (
+            doi TEXT PRIMARY KEY,
+            pmid TEXT,
+            is_free_pmc INTEGER,
+            title TEXT,
+            abstract TEXT,
+            successful_donwload INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS source (
+            doi TEXT NOT NULL,
+            src_domain TEXT,
+            link_to_paper TEXT NOT NULL,
+            PRIMARY KEY (doi, link_to_paper)
+        )""",
+        "CREATE INDEX IF NOT EXISTS gds_doi ON gds (doi)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS publication_pmid ON publication (pmid)",
+    ]
+
+    def __init__(self, database_dir):
+
+        self.path = database_dir / 'registry.sqlite'
+        is_new = not self.path.exists()
+
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+
+        with self.connection:
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+        #carry over a database kept in csv mode.
+        if is_new:
+            legacy = csv_registry(database_dir)
+            self.add_gds(legacy.gds)
+            self.add_publication(legacy.publication, legacy.source)
+
+
+    def _exists(self, query, param):
+        return self.connection.execute(query, (param,)).fetchone() is not None
+
+
+    def _select(self, query, params, table):
+
+        frame = pd.read_sql_query(query, self.connection, params=params)
+
+        if 'publication' == table:
+            frame['is_free_pmc'] = frame.is_free_pmc.astype(bool)
+
+        return frame[columns[table]]
+
+
+    def _rows(self, frame, table):
+
+        frame = frame[columns[table]].astype(object).where(frame[columns[table]].notna(), None)
+
+        return frame.values.tolist()
+
+
+    def has_gds(self, gds_uid):
+        return self._exists("SELECT 1 FROM gds WHERE gds_uid = ?", gds_uid)
+
+
+    def has_publication(self, doi):
+        return self._exists("SELECT 1 FROM publication WHERE doi = ?", doi)
+
+
+    def has_pmid(self, pmid):
+        return self._exists("SELECT 1 FROM publication WHERE pmid = ?", pmid)
+
+
+    def new_publication(self, publication, source):
+
+        is_new = ~publication.doi.map(self.has_publication).astype(bool)
+
+        return publication[is_new], source[source.doi.isin(publication[is_new].doi)]
+
+
+    def add_gds(self, gds):
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO gds (gds_uid, doi) VALUES (?, ?)",
+                self._rows(gds, 'gds')
+            )
+
+
+    def add_publication(self, publication, source):
+
+        #one transaction, so a publication is never stored without its sources.
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO publication (doi, pmid, is_free_pmc, title, abstract, successful_donwload) VALUES (?, ?, ?, ?, ?, ?)",
+                self._rows(publication, 'publication')
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO source (doi, src_domain, link_to_paper) VALUES (?, ?, ?)",
+                self._rows(source, 'source')
+            )
+
+
+    def doi_by_gds_uid(self, gds_uid):
+
+        row = self.connection.execute("SELECT doi FROM gds WHERE gds_uid = ?", (gds_uid,)).fetchone()
+
+        return None if row is None else row[0]
+
+
+    def gds_uids_by_doi(self, doi):
+        return self._select("SELECT * FROM gds WHERE doi = ?", (doi,), 'gds').gds_uid
+
+
+    def publication_by(self, type_of_identifier, identifier):
+
+        if type_of_identifier not in ('doi', 'pmid'):
+            raise AttributeError("Invalid identifier format.")
+
+        return self._select(f"SELECT * FROM publication WHERE {type_of_identifier} = ?", (identifier,), 'publication')
+
+
+    def source_by_doi(self, doi):
+        return self._select("SELECT * FROM source WHERE doi = ?", (doi,), 'source')
+
+
+    def lookup_many(self, type_of_identifier, identifiers, chunk_size=500):
+
+        if type_of_identifier not in ('gds_uid', 'doi', 'pmid'):
+            raise AttributeError("Invalid identifier format.")
+
+        identifiers = list(identifiers)
+        found = []
+
+        if 'gds_uid' == type_of_identifier:
+            query = """SELECT g.gds_uid, g.doi, p.pmid
+                FROM gds g LEFT JOIN publication p ON p.doi = g.doi WHERE g.gds_uid IN ({})"""
+        else:
+            query = f"""SELECT (SELECT g.gds_uid FROM gds g WHERE g.doi = p.doi LIMIT 1) AS gds_uid, p.doi, p.pmid
+                FROM publication p WHERE p.{type_of_identifier} IN ({{}})"""
+
+        #chunked to stay under sqlite's limit on bound parameters.
+        for start in range(0, len(identifiers), chunk_size):
+            chunk = identifiers[start:start + chunk_size]
+            found.append(pd.read_sql_query(query.format(', '.join('?' * len(chunk))), self.connection, params=chunk))
+
+        found = pd.concat(found, ignore_index=True) if [] != found else pd.DataFrame(columns=['gds_uid', 'doi', 'pmid'])
+        found = found.astype(object).drop_duplicates(subset=[type_of_identifier])
+
+        frame = pd.DataFrame({type_of_identifier: pd.Series(identifiers, dtype=object)})
+
+        return frame.merge(found, on=type_of_identifier, how='left')[['gds_uid', 'doi', 'pmid']]
+
+
+    def abstracts(self):
+        return pd.read_sql_query("SELECT doi, abstract FROM publication", self.connection)
+
+
+    def commit(self):
+        self.connection.commit()
+
+
+registries = {
+    'csv': csv_registry,
+    'parquet': parquet_registry,
+    'sqlite': sqlite_registry,
+}
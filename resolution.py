@@ -0,0 +1,89 @@
+import time
+import sqlite3
+import threading
+
+
+#how a gds uid was bound to its publication.
+methods = ['direct_link', 'accession_hit', 'similarity', 'none']
+
+
+class resolution_memo():
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS resolution (
+            gds_uid TEXT PRIMARY KEY,
+            doi TEXT,
+            pmid TEXT,
+            method TEXT NOT NULL,
+            score REAL,
+            resolved_at REAL NOT NULL,
+            retry_after REAL
+        )""",
+    ]
+
+    def __init__(self, path, negative_ttl=30 * 24 * 3600):
+
+        self.path = path
+        self.negative_ttl = negative_ttl
+
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self.connection:
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+
+    def get(self, gds_uid):
+
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT doi, pmid, method, score, retry_after FROM resolution WHERE gds_uid = ?", (str(gds_uid),)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        doi, pmid, method, score, retry_after = row
+
+        #a negative result is forgotten once its retry time has passed; pubmed links get added later.
+        if (retry_after is not None) and (retry_after <= time.time()):
+            return None
+
+        return {'doi': doi, 'pmid': pmid, 'method': method, 'score': score}
+
+
+    def is_unbound(self, gds_uid):
+
+        memo = self.get(gds_uid)
+
+        return (memo is not None) and (memo['doi'] is None)
+
+
+    def put(self, gds_uid, doi, pmid, method, score=None, retry_after=None):
+
+        if method not in methods:
+            raise ValueError(f"Unknown resolution method: {method}")
+
+        now = time.time()
+
+        if (doi is None) and (retry_after is None):
+            retry_after = now + self.negative_ttl
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO resolution (gds_uid, doi, pmid, method, score, resolved_at, retry_after) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(gds_uid), doi, pmid, method, score, now, retry_after)
+            )
+
+
+    def stats(self):
+
+        with self._lock:
+            rows = self.connection.execute("SELECT method, COUNT(*) FROM resolution GROUP BY method").fetchall()
+
+        return dict(rows)
+
+
+    def close(self):
+        self.connection.close()
@@ -9,12 +9,13 @@ import requests
 from lxml import html
 
 from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver import Chrome, ChromeOptions
 
 import sidekit
+from authors import author_index
+from extractors import selectors, extract_publication
+from telemetry import metrics
 
 from utils import *
-from utils import namespace_regrex
 
 def word_level_comprehension_score(src, tgt):
 
@@ -26,110 +27,75 @@ def word_level_comprehension_score(src, tgt):
 
 class scraping():
 
-    def __init__(self, executable_path, cache_path, download_path):
+    def __init__(self, pool, cache, concurrency=8, per_host=4, limiter=None):
         
-        self.driver = self._make_driver(executable_path, download_path)
-        self.html_loader = sidekit.page_source(self.driver, cache_path)
+        self.pool = pool
+        self.html_loader = sidekit.page_source(pool, cache, limiter=limiter)
+        self.http_loader = sidekit.http_source(cache, concurrency=concurrency, per_host=per_host, limiter=limiter)
 
-            
-    def _make_driver(self, executable_path=None, download_path=None):
-
-        mime_types_pdf = "application/pdf,application/vnd.adobe.xfdf,application/vnd.fdf,application/vnd.adobe.xdp+xml, application/octet-stream"
-        
-        options = ChromeOptions()
-        options.add_argument('--kiosk')
-        options.add_argument('--kiosk-printing')
-        options.add_argument("--disable-extensions")
-        options.add_argument('--headless')
-
-        prefs = {
-            "download.default_directory" :  download_path, 
-            "download.prompt_for_download": False,
-            "download.directory_upgrade": True,
-            "safebrowsing.enabled": True
-        }
-        options.add_experimental_option("prefs", prefs)
-
-        driver = Chrome(
-            executable_path=executable_path,
-            chrome_options=options
-        )
-        driver.set_window_position(0, 0)
-        driver.set_window_size(1024, 768)
-
-        return driver
     
     #private
-    def _get_dom(self, query, param=None, domain="https://www.ncbi.nlm.nih.gov"):
+    def _get_dom(self, query, param=None, domain="https://www.ncbi.nlm.nih.gov", render=False):
 
-        src = self.html_loader.get(domain + query%tuple([param] if param is not None else []))
+        #NCBI pages are rendered on server side. use the browser only for pages needing JavaScript.
+        loader = self.html_loader if render else self.http_loader
+
+        src = loader.get(domain + query%tuple([param] if param is not None else []))
         dom = html.fromstring(src.replace("&nbsp;",""))
 
         return dom
 
 
-    def _dom_chunk_from_href(self, dom, xpath, domain=""):
+    def _dom_chunk_from_href(self, dom, xpath, domain="https://www.ncbi.nlm.nih.gov"):
         
-        dom_chunk = []
-    
-        for has_href in dom.cssselect(xpath):
-            dom = self._get_dom(has_href.attrib['href'])
-            dom_chunk.append(dom)
+        urls = [domain + has_href.attrib['href'] for has_href in xpath(dom)]
+
+        srcs = self.http_loader.get_many(urls)
+        dom_chunk = [html.fromstring(src.replace("&nbsp;","")) for src in srcs]
     
         return dom_chunk
 
     
     def _is_their_publication(self, contributors, authers):
 
-        is_same = lambda a, b: ((a in b) | (b in a))
-
-        contributors = sorted(contributors, reverse=True, key=len)
-        authers = sorted(authers, reverse=True, key=len)
-        count = 0
-        for contributor in contributors:
-            for i, auther in enumerate(authers):
-                if is_same(contributor, auther):
-                    count += 1
-                    authers.pop(i)
-                    break
+        return author_index(contributors).match(authers)
 
-        return (len(contributors) == count)
 
+    def fetch_publication_doms(self, search_pubmed_by, param):
 
-    def search_publication_detail(self, search_pubmed_by, param):
-    
-        publication = []
-        source = []
-     
         dom = self._get_dom(search_pubmed_by, param)
-        is_abstruction_page = ([] != dom.cssselect(".abstr"))
+        is_abstruction_page = ([] != selectors['abstract_page'](dom))
     
         abstr_chunk = []
     
         if not is_abstruction_page:
     
-            abstr_chunk = self._dom_chunk_from_href(dom, ".rprt > .title > a")
+            abstr_chunk = self._dom_chunk_from_href(dom, selectors['result_links'])
     
         else:
     
             abstr_chunk.append(dom)
+
+        return abstr_chunk
+
+
+    def parse_publication_doms(self, abstr_chunk):
+    
+        publication = []
+        source = []
     
         for dom in abstr_chunk:
-            doi = dom.cssselect(".rprtid")[0].xpath('//a[re:test(@href, "(?i)(doi.org/*)")]', namespaces=namespace_regrex)[0].text.replace('/', '_slash') 
 
-            aux_txt = dom.cssselect(".aux")[0].text_content()
+            with metrics.timer('parse_seconds', selectors='publication'):
+                fields = extract_publication(dom)
 
-            pmid = regrex_pmid.findall(aux_txt)[0]
-        
-            is_free_pmc = (not [] == dom.cssselect(".status_icon"))
-            
-            abstruct = dom.cssselect(".abstr > div > p")[0].text
-    
-            title = dom.cssselect(".abstract > h1")[0].text
-            
-            links_to_paper = [element.attrib['href'] for element in dom.cssselect(".portlet > a")]
+            if fields is None: #no doi or pmid to register it by
+                continue
 
-            publication.append([doi, pmid, is_free_pmc, title, abstruct, None])
+            doi = fields['doi']
+            links_to_paper = fields['links_to_paper']
+
+            publication.append([doi, fields['pmid'], fields['is_free_pmc'], fields['title'], fields['abstract'], None])
 
             for link_to_paper in links_to_paper:
     
@@ -140,15 +106,30 @@ class scraping():
         return publication, source
 
 
+    def search_publication_detail(self, search_pubmed_by, param):
+
+        return self.parse_publication_doms(self.fetch_publication_doms(search_pubmed_by, param))
+
+
+    def fetch_pmc_text(self, pmid):
+
+        try:
+            dom = self._get_dom(pmc_article_by_pmid, pmid)
+        except requests.RequestException:
+            return ""
+
+        return dom.text_content()
+
+
     def search_relative_pmids_with_gds(self, uid, similarity_fn=word_level_comprehension_score):
 
         find_related_publication = False
 
         dom = self._get_dom(search_gds_by_uid, uid)
         
-        accession_number = dom.cssselect(".rprtid > dd")[0].text
+        accession_number = selectors['accession_number'](dom)[0].text
 
-        title = dom.cssselect(".title > a")[0]
+        title = selectors['dataset_title'](dom)[0]
         to_gse_link = title.attrib['href']
 
         dataset_title = title.text
@@ -158,24 +139,22 @@ class scraping():
         
         other_accession_number = regrex_accession_number.findall(dom.text_content())
         publication_date_of_dataset = parse(regrex_publication_date_on_accession_display.findall(dom.text_content())[0])
-        contributors = regrex_auther.findall(str(dom.xpath('//a/@href')))
+        contributors = regrex_auther.findall(str(selectors['contributor_links'](dom)))
         
         
         dom = self._get_dom(search_pubmed_by_contributor, contributors[0])
         
-        desc = dom.cssselect(".rprt .desc")
+        desc = selectors['descriptions'](dom)
         authers_list = [desc[i].text_content()[:-1].split(', ') for i in range(len(desc))] #delete period by [:-1]
 
-        matched_idx = []
-        
-        for idx, authers in enumerate(authers_list):
-            if self._is_their_publication(contributors, authers):
-                matched_idx.append(idx)
+        #contributors are normalized once, then every row is a few dict lookups.
+        with metrics.timer('parse_seconds', selectors='contributor'):
+            matched_idx = author_index(contributors).match_all(authers_list)
         
         date_intervals = []
         matched_idx_to_date_intervals_idx_table = {}
         
-        details = dom.cssselect(".rprt .details")
+        details = selectors['details'](dom)
 
         
         for i, idx in enumerate(matched_idx):
@@ -189,8 +168,8 @@ class scraping():
         matched_idx = sorted(matched_idx, key=lambda idx: date_intervals[matched_idx_to_date_intervals_idx_table[idx]])
         
         
-        titles = dom.cssselect(".rprt .title a")
+        titles = selectors['titles'](dom)
 
         pmids = [titles[idx].attrib['href'].split('/')[-1] for idx in matched_idx]
 
-        return pmids
\ No newline at end of file
+        return pmids, accession_number, other_accession_number, dataset_title
\ No newline at end of file
@@ -9,7 +9,14 @@ import codecs
 import base64
 import hashlib
 import zipfile
+import asyncio
 from io import BytesIO
+from functools import partial
+from collections import defaultdict
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions
@@ -17,17 +24,17 @@ from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.action_chains import ActionChains
+from ratelimit import rate_limiter, backoff, retry_after, retry_status
+from telemetry import metrics
 
 class page_source:
-    def __init__(self, driver, save_path, cool_time=1.6):
+    def __init__(self, pool, cache, cool_time=1.6, limiter=None):
 
-        self.driver = driver
-        self.actions = ActionChains(driver)
-        self.save_path = save_path
+        self.pool = pool
+        self.cache = cache
+        self.limiter = limiter if limiter is not None else rate_limiter()
         self.cool_time = 3.2
-        self.symbol = re.compile("[^一-龥ぁ-んァ-ンa-xA-Z0-9_]")
   #      self.logfile = open('page_source.log','a')
-        self.current = None
   #      self.currentfile = open("current.html", 'w')
 
     def __del__(self):
@@ -38,78 +45,72 @@ class page_source:
    #     self.currentfile.close()
 
   #      self.logfile.close()
+        pass
 
-    def get(self, url, tgt_xpath=None, time_out=2.56, remain=3, nametype='raw', use_cache=True, output=True):
+    def get(self, url, tgt_xpath=None, time_out=2.56, remain=3, use_cache=True, output=True, driver=None):
         
         if output:
             print(url)
 
-        # old_filename = hashlib.md5(url.encode('utf-8')).hexdigest()
-        # old_file_path = os.path.join(self.save_path, old_filename)
-        # old_filename = hashlib.sha1(url.encode('utf-8')).hexdigest()
-        # old_file_path = os.path.join(self.save_path, old_filename)
-        if 'raw' == nametype:
-            filename = re.sub(self.symbol, "", url)
-        elif 'md5' == nametype:
-            filename = hashlib.md5(url.encode('utf-8')).hexdigest()
-        elif 'sha1' == nametype:
-            filename = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        host = urlsplit(url).netloc
+        src = self.cache.get(url) if use_cache else None
 
-        file_path = os.path.join(self.save_path, filename)
-
-
-        if os.path.isfile(file_path) & use_cache:
-            file_proxy = codecs.open(file_path, 'r', 'UTF-8')
-            src = file_proxy.read()
-            file_proxy.close()
+        if use_cache:
+            metrics.count('cache_misses' if src is None else 'cache_hits', host=host)
 
+        if src is not None:
             return src
         else:
-            while True:
-                try:
-                    print("connect")
-                    self.driver.get(url)
-                except:
-                    remain -= 1
-                    
-                    if 0 <= remain:
-                        time.sleep( 600 )
-                        continue
-
-                    if input(">>CONTINUE ? (yes/no)") == 'no':
-                        if input(">>REALLY ? (yes/no)") == 'yes':
-                                sys.exit()
-                else:
-                    break
+            with self.pool.borrow(driver) as driver:
+                attempt = 0
+
+                while True:
+                    self.limiter.acquire(url)
+
+                    try:
+                        print("connect")
+                        with metrics.timer('render_seconds', host=host):
+                            driver.get(url)
+                    except Exception:
+                        attempt += 1
+                        metrics.count('fetch_retries', host=host)
+
+                        #give up to the caller instead of waiting on a prompt nobody answers.
+                        if attempt > remain:
+                            raise
+
+                        time.sleep( backoff(attempt) )
+                    else:
+                        break
             
-            wait_time = 0
-            response_time = self.driver.execute_script(
-                "return performance.timing.loadEventEnd - performance.timing.navigationStart;"
-            )
-
-            if None == tgt_xpath:
-                print(f"response_time: {response_time}us")
-                print(f"cool time: {self.cool_time}s")
+                wait_time = 0
+                response_time = driver.execute_script(
+                    "return performance.timing.loadEventEnd - performance.timing.navigationStart;"
+                )
+
+                if None == tgt_xpath:
+                    print(f"response_time: {response_time}us")
+                    print(f"cool time: {self.cool_time}s")
 #                time.sleep( self.cool_time )
 
-            else:
-                try:
-                    start = time.time()
+                else:
+                    try:
+                        start = time.time()
 
-                    for xpath in tgt_xpath:
-                        WebDriverWait(self.driver, time_out).until(
-                            expected_conditions.presence_of_element_located((By.XPATH, xpath))
-                        )
-                        time_out /= 2
+                        for xpath in tgt_xpath:
+                            WebDriverWait(driver, time_out).until(
+                                expected_conditions.presence_of_element_located((By.XPATH, xpath))
+                            )
+                            time_out /= 2
 
-                    elapsed_time = time.time() - start
-                    print(f"wait time: {elapsed_time}")
+                        elapsed_time = time.time() - start
+                        print(f"wait time: {elapsed_time}")
                     
-                    if 1 > elapsed_time:
-                        time.sleep( 1 - elapsed_time)
+                        if 1 > elapsed_time:
+                            time.sleep( 1 - elapsed_time)
                 
-                except:
-                    print(f"""
+                    except:
+                        print(f"""
                         ===============================================
                         >> Warning!!! indicated element has not loaded.
                         ===============================================
@@ -117,13 +118,112 @@ class page_source:
                         XPath = {tgt_xpath}
                     """)
 
-            self.current = self.driver.page_source
+                #drivers are shared across threads, so the page stays local to this call.
+                src = driver.page_source
             
-            file_proxy = codecs.open(file_path, 'w', 'UTF-8')
-            file_proxy.write(self.current)
-            file_proxy.close()
+                self.cache.put(url, src)
+
+            return src.replace("\xa0","").replace("&nbsp;","")
+
+
+class http_source:
+    def __init__(self, cache, concurrency=8, per_host=4, time_out=30., headers=None, limiter=None):
+
+        self.cache = cache
+        self.limiter = limiter if limiter is not None else rate_limiter()
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.time_out = time_out
+
+        # one keep-alive connection pool shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0 Safari/537.36",
+            'Connection': "keep-alive",
+        })
+        if headers is not None:
+            self.session.headers.update(headers)
+
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def __del__(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def get(self, url, remain=3, use_cache=True, output=True):
+
+        if output:
+            print(url)
+
+        host = urlsplit(url).netloc
+        src = self.cache.get(url) if use_cache else None
+
+        if use_cache:
+            metrics.count('cache_misses' if src is None else 'cache_hits', host=host)
+
+        if src is not None:
+            return src
+
+        for attempt in range(remain + 1):
+            with metrics.timer('rate_limit_wait_seconds', host=host):
+                self.limiter.acquire(url)
+
+            try:
+                with metrics.timer('fetch_seconds', host=host):
+                    response = self.session.get(url, timeout=self.time_out)
+
+                #429 and 5xx are retried; the pause is shared by every worker on the host.
+                if (response.status_code in retry_status) and (attempt < remain):
+                    metrics.count('fetch_retries', host=host, status=response.status_code)
+                    self.limiter.penalize(url, retry_after(response.headers, backoff(attempt)))
+                    continue
+
+                response.raise_for_status()
+            except requests.HTTPError:
+                raise
+            except requests.RequestException:
+                if attempt == remain:
+                    raise
+
+                metrics.count('fetch_retries', host=host)
+                time.sleep( backoff(attempt) )
+            else:
+                break
+
+        if output:
+            print(f"response_time: {response.elapsed.total_seconds()}s")
+
+        #get_many calls this from several threads, so the page stays local to this call.
+        src = response.text
+
+        self.cache.put(url, src, response.status_code)
+
+        return src.replace("\xa0","").replace("&nbsp;","")
+
+    async def get_async(self, url, **kwargs):
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.executor, partial(self.get, url, **kwargs))
+
+    def get_many(self, urls, per_host=None, **kwargs):
+
+        per_host = self.per_host if per_host is None else per_host
+
+        async def gather():
+            semaphores = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+            async def bounded(url):
+                async with semaphores[urlsplit(url).netloc]:
+                    return await self.get_async(url, **kwargs)
+
+            # gather keeps the order of urls
+            return await asyncio.gather(*[bounded(url) for url in urls])
 
-            return self.current.replace("\xa0","").replace("&nbsp;","")
+        return asyncio.run(gather())
 
 
 def clear_firefox(
@@ -132,13 +232,13 @@ def clear_firefox(
     ):
 
     def get_Minimize_memory_usage_button(driver):
-        return driver.find_element_by_xpath("//*[contains( ./text() , 'Minimize memory usage')]")
+        return driver.find_element(By.XPATH, "//*[contains( ./text() , 'Minimize memory usage')]")
 
     def get_clear_cache_button(driver):
-        return driver.find_element_by_css_selector('#clearCacheButton')
+        return driver.find_element(By.CSS_SELECTOR, '#clearCacheButton')
     
     def get_clear_site_data_button(driver):
-        return driver.find_element_by_css_selector('#clearSiteDataButton')
+        return driver.find_element(By.CSS_SELECTOR, '#clearSiteDataButton')
 
     wait = WebDriverWait(driver, timeout)
 
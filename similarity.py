@@ -0,0 +1,124 @@
+import re
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+
+regrex_word = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return regrex_word.findall(text.lower()) if isinstance(text, str) else []
+
+
+class tfidf_index():
+
+    def __init__(self, n_features=1 << 18):
+
+        #hashed features: no vocabulary to keep, and unseen words in a query still land somewhere.
+        self.n_features = n_features
+        self.idf = np.ones(n_features)
+        self.df = np.zeros(n_features)
+        self.n_docs = 0
+        self.keys = []
+
+        #raw counts of each add(); weighted and stacked only when top_k needs the whole matrix.
+        self.parts = []
+        self._matrix = sparse.csr_matrix((0, n_features))
+
+
+    def _feature(self, term):
+        return zlib.crc32(term.encode()) % self.n_features
+
+
+    def _counts(self, texts):
+
+        indptr = [0]
+        indices = []
+
+        for text in texts:
+            indices += [self._feature(term) for term in tokenize(text)]
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, self.n_features)
+        )
+        counts.sum_duplicates()
+
+        return counts
+
+
+    def _weighted(self, counts):
+
+        #scaling the stored values keeps the matrix sparse; rows are l2 normalized for cosine.
+        weights = counts.data * self.idf[counts.indices]
+        rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=counts.shape[0]))
+        norms[0 == norms] = 1.
+
+        return sparse.csr_matrix((weights / norms[rows], counts.indices, counts.indptr), shape=counts.shape)
+
+
+    def fit(self, keys, texts):
+
+        self.df = np.zeros(self.n_features)
+        self.n_docs = 0
+        self.keys = []
+        self.parts = []
+
+        return self.add(keys, texts)
+
+
+    def add(self, keys, texts):
+
+        #document frequencies are updated in place, so new texts cost themselves, not a refit.
+        counts = self._counts(texts)
+
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs += counts.shape[0]
+        self.idf = np.log((1. + self.n_docs) / (1. + self.df)) + 1.
+
+        self.keys += list(keys)
+        self.parts.append(counts)
+        self._matrix = None
+
+        return self
+
+
+    @property
+    def matrix(self):
+
+        if self._matrix is None:
+            self.parts = [sparse.vstack(self.parts, format='csr')] if [] != self.parts else []
+            self._matrix = self._weighted(self.parts[0]) if [] != self.parts else sparse.csr_matrix((0, self.n_features))
+
+        return self._matrix
+
+
+    def transform(self, texts):
+        return self._weighted(self._counts(texts))
+
+
+    def score(self, query, texts):
+
+        #cosine similarity of the query against every text in one product.
+        return (self.transform(texts) @ self.transform([query]).T).toarray().ravel()
+
+
+    def top_k(self, queries, k=10):
+
+        scores = (self.matrix @ self.transform(queries).T).toarray() #(n_docs, n_queries)
+        k = min(k, scores.shape[0])
+
+        results = []
+
+        for column in scores.T:
+            idx = np.argpartition(-column, k - 1)[:k] if 0 < k else np.array([], dtype=np.int64)
+            idx = idx[np.argsort(-column[idx])]
+
+            results.append([(self.keys[i], column[i]) for i in idx])
+
+        return results
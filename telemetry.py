@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _label_text(labels, quote=''):
+    return ','.join(f'{label}={quote}{value}{quote}' for label, value in labels)
+
+
+class jsonl_sink():
+
+    #one line per observation, for offline analysis of a run.
+    def __init__(self, path):
+
+        self.file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+
+    def event(self, record):
+
+        with self._lock:
+            self.file.write(json.dumps(record) + '\n')
+
+
+    def flush(self, snapshot):
+
+        with self._lock:
+            self.file.flush()
+
+
+    def close(self):
+        self.file.close()
+
+
+class prometheus_sink():
+
+    #a file for node_exporter's textfile collector, rewritten at every flush.
+    def __init__(self, path, prefix='nspider'):
+
+        self.path = path
+        self.prefix = prefix
+
+
+    def event(self, record):
+        pass
+
+
+    def _series(self, name, labels):
+
+        label_text = _label_text(labels, quote='"')
+
+        return f'{self.prefix}_{name}{{{label_text}}}' if '' != label_text else f'{self.prefix}_{name}'
+
+
+    def flush(self, snapshot):
+
+        lines = []
+        typed = set()
+
+        #one TYPE line per metric, however many label sets it has. snapshots come sorted by name.
+        for name, labels, value in snapshot['counters']:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {self.prefix}_{name}_total counter')
+            lines.append(f'{self._series(name + "_total", labels)} {value}')
+
+        for name, labels, count, total, maximum in snapshot['timers']:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {self.prefix}_{name} summary')
+            lines.append(f'{self._series(name + "_sum", labels)} {total}')
+            lines.append(f'{self._series(name + "_count", labels)} {count}')
+
+        #the collector must never read a half written file.
+        tmp_path = f'{self.path}.tmp'
+
+        with open(tmp_path, 'w', encoding='utf-8') as file_proxy:
+            file_proxy.write('\n'.join(lines) + '\n')
+
+        os.replace(tmp_path, self.path)
+
+
+    def close(self):
+        pass
+
+
+class telemetry():
+
+    def __init__(self):
+
+        self.counters = defaultdict(float)
+        self.timers = defaultdict(lambda: [0, 0., 0.]) #count, total, max
+        self.sinks = []
+        self._lock = threading.Lock()
+
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+
+    def _emit(self, kind, name, value, labels):
+
+        record = {'time': time.time(), 'kind': kind, 'name': name, 'value': value, 'labels': labels}
+
+        for sink in self.sinks:
+            sink.event(record)
+
+
+    def count(self, name, value=1, **labels):
+
+        with self._lock:
+            self.counters[_key(name, labels)] += value
+
+        if [] != self.sinks:
+            self._emit('counter', name, value, labels)
+
+
+    def observe(self, name, seconds, **labels):
+
+        with self._lock:
+            timer = self.timers[_key(name, labels)]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+        if [] != self.sinks:
+            self._emit('timer', name, seconds, labels)
+
+
+    @contextmanager
+    def timer(self, name, **labels):
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+
+    def snapshot(self):
+
+        with self._lock:
+            return {
+                'counters': [(name, labels, value) for (name, labels), value in sorted(self.counters.items())],
+                'timers': [(name, labels, *timer) for (name, labels), timer in sorted(self.timers.items())],
+            }
+
+
+    def flush(self):
+
+        snapshot = self.snapshot()
+
+        for sink in self.sinks:
+            sink.flush(snapshot)
+
+
+    def summary(self):
+
+        snapshot = self.snapshot()
+        lines = [f"{'timer':56} {'count':>8} {'total':>10} {'mean':>10} {'max':>10}"]
+
+        #where the time went, largest first.
+        for name, labels, count, total, maximum in sorted(snapshot['timers'], key=lambda timer: -timer[3]):
+            label = f'{name}{{{_label_text(labels)}}}' if () != labels else name
+            lines.append(f"{label[:56]:56} {count:8d} {total:9.2f}s {total / count * 1e3:8.1f}ms {maximum * 1e3:8.1f}ms")
+
+        lines.append(f"{'counter':56} {'value':>8}")
+
+        for name, labels, value in snapshot['counters']:
+            label = f'{name}{{{_label_text(labels)}}}' if () != labels else name
+            lines.append(f"{label[:56]:56} {value:8g}")
+
+        return '\n'.join(lines)
+
+
+    def reset(self):
+
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+
+#shared by every module, the way a logger would be.
+metrics = telemetry()
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+
+#the modules live at the repository root, not in a package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,94 @@
+from pathlib import Path
+from datetime import date
+
+from lxml import etree
+
+from eutils import eutils, parse_elink, parse_prlinks, parse_efetch
+
+
+fixtures = Path(__file__).resolve().parent / 'fixtures' / 'eutils'
+
+
+def load(name):
+    return etree.fromstring((fixtures / name).read_bytes())
+
+
+def test_parse_elink_keeps_only_the_requested_linkname():
+
+    links = parse_elink(load('elink_gds_pubmed.xml'))
+
+    assert {'200011474': ['18650386'], '200030845': [], '200040001': ['22000001', '22000002']} == links
+
+
+def test_parse_prlinks_skips_ids_without_a_provider():
+
+    provider_links = parse_prlinks(load('elink_prlinks.xml'))
+
+    assert {'18650386': 'https://www.pnas.org/doi/full/10.1073/pnas.0804292105'} == provider_links
+
+
+def test_parse_efetch_publications():
+
+    publication, source = parse_efetch(load('efetch_pubmed.xml'), parse_prlinks(load('elink_prlinks.xml')))
+
+    #the letter without a doi is skipped.
+    assert ['18650386', '22000001', '22000003'] == [row[1] for row in publication]
+
+    doi, pmid, is_free_pmc, title, abstract, successful_donwload = publication[0]
+
+    assert '10.1073_slashpnas.0804292105' == doi
+    assert is_free_pmc
+    assert 'Expression of Arabidopsis genes under stress.' == title
+    assert 'Plants respond to stress. Data are in GEO under GSE11474.' == abstract
+    assert successful_donwload is None
+
+    #the doi falls back to the ELocationID; no abstract is None, not ''.
+    assert ['10.1000_slashexample.2012.1', '22000001', False, 'A publication known only by its location id.', None, None] == publication[1]
+
+
+def test_parse_efetch_embargoed_pmc_is_not_free():
+
+    root = load('efetch_pubmed.xml')
+
+    publication, source = parse_efetch(root)
+    embargoed = [row for row in publication if '22000003' == row[1]][0]
+
+    assert not embargoed[2]
+    assert [] == [row for row in source if '10.1000_slashexample.2098.3' == row[0]]
+
+    #free once the release day has passed.
+    publication, source = parse_efetch(root, today=date(2099, 1, 1))
+
+    assert [row for row in publication if '22000003' == row[1]][0][2]
+    assert 1 == len([row for row in source if '10.1000_slashexample.2098.3' == row[0]])
+
+
+def test_parse_efetch_sources_publisher_before_pmc():
+
+    _, source = parse_efetch(load('efetch_pubmed.xml'), parse_prlinks(load('elink_prlinks.xml')))
+
+    assert [
+        ['10.1073_slashpnas.0804292105', 'www.pnas.org', 'https://www.pnas.org/doi/full/10.1073/pnas.0804292105'],
+        ['10.1073_slashpnas.0804292105', 'www.ncbi.nlm.nih.gov', 'https://www.ncbi.nlm.nih.gov/pmc/articles/pmid/18650386/'],
+    ] == source
+
+
+def test_publication_details_by_gds_uids_offline(monkeypatch):
+
+    responses = {'gds': 'elink_gds_pubmed.xml', 'prlinks': 'elink_prlinks.xml', 'efetch': 'efetch_pubmed.xml'}
+
+    def request(endpoint, **params):
+        if 'efetch.fcgi' == endpoint:
+            return load(responses['efetch'])
+        return load(responses['prlinks'] if 'prlinks' == params.get('cmd') else responses['gds'])
+
+    backend = eutils()
+    monkeypatch.setattr(backend, '_request', request)
+
+    details = backend.publication_details_by_gds_uids(['200011474', '200030845', '200040001'])
+
+    assert ['18650386'] == [row[1] for row in details['200011474'][0]]
+    assert 2 == len(details['200011474'][1])
+    assert ([], []) == details['200030845']
+    assert ['22000001'] == [row[1] for row in details['200040001'][0]]
+    assert [] == details['200040001'][1]
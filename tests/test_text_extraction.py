@@ -0,0 +1,94 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from text_extraction import text_extractor, file_hash
+
+
+fixtures = Path(__file__).resolve().parent / 'fixtures'
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+
+    path = tmp_path / 'two_pages.pdf'
+    shutil.copy(fixtures / 'two_pages.pdf', path)
+
+    return path
+
+
+@pytest.fixture
+def extractor():
+
+    extractor = text_extractor(workers=1, pages_per_task=1)
+    yield extractor
+    extractor.close()
+
+
+def test_extract_reads_every_page(extractor, pdf_path):
+
+    text = extractor.extract(pdf_path)
+
+    assert 'GSE12345' in text
+    assert 'Second page' in text
+
+
+def test_extract_writes_sidecar(extractor, pdf_path):
+
+    text = extractor.extract(pdf_path)
+    sidecar = extractor.sidecar(pdf_path)
+
+    assert sidecar.exists()
+    assert 'sha256 ' + file_hash(pdf_path) == sidecar.read_text(encoding='utf-8').splitlines()[0]
+    assert text == extractor.extract(pdf_path)
+
+
+def test_iter_pages_yields_pages_in_order(extractor, pdf_path):
+
+    pages = list(extractor.iter_pages(pdf_path))
+
+    assert 2 == len(pages)
+    assert 'GSE12345' in pages[0]
+    assert 'Second page' in pages[1]
+
+
+def test_early_exit_writes_no_sidecar(extractor, pdf_path):
+
+    for page in extractor.iter_pages(pdf_path):
+        break
+
+    assert 'GSE12345' in page
+    assert not extractor.sidecar(pdf_path).exists()
+
+
+def test_page_ranges_parse_the_first_page_alone(pdf_path):
+
+    extractor = text_extractor(workers=1, pages_per_task=8)
+
+    try:
+        assert [(0, 1), (1, 2)] == extractor.page_ranges(pdf_path)
+    finally:
+        extractor.close()
+
+
+def test_early_exit_leaves_later_chunks_unsubmitted(pdf_path, monkeypatch):
+
+    extractor = text_extractor(workers=1, pages_per_task=1, in_flight=1)
+    submitted = []
+    submit = extractor.executor.submit
+
+    def counting_submit(fn, *args):
+        submitted.append(args[1:])
+        return submit(fn, *args)
+
+    monkeypatch.setattr(extractor.executor, 'submit', counting_submit)
+
+    try:
+        for page in extractor.iter_pages(pdf_path):
+            break
+    finally:
+        extractor.close()
+
+    #the page count, then the first page only.
+    assert [(), (0, 1)] == submitted
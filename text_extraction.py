@@ -0,0 +1,138 @@
+import os
+import hashlib
+from itertools import islice
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2 as pypdf
+
+
+def file_hash(path, chunk_size=1 << 20):
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file_proxy:
+        for chunk in iter(lambda: file_proxy.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+#module level, so that worker processes can unpickle them.
+def _num_pages(path):
+
+    with open(path, 'rb') as file_proxy:
+        return len(pypdf.PdfReader(file_proxy).pages)
+
+
+def _pages_text(path, start, stop):
+
+    with open(path, 'rb') as file_proxy:
+        reader = pypdf.PdfReader(file_proxy)
+        return [reader.pages[page_number].extract_text() for page_number in range(start, stop)]
+
+
+class text_extractor():
+
+    header = 'sha256 '
+
+    def __init__(self, workers=None, pages_per_task=8, in_flight=2):
+
+        self.pages_per_task = pages_per_task
+        self.in_flight = in_flight
+
+        #parsing is cpu bound and runs in other processes.
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+
+    def sidecar(self, path):
+        return Path(path).with_suffix('.txt')
+
+
+    def _read_sidecar(self, path, digest):
+
+        sidecar = self.sidecar(path)
+
+        if not sidecar.exists():
+            return None
+
+        with open(sidecar, encoding='utf-8') as file_proxy:
+            #a pdf replaced under the same name gets a different hash.
+            if self.header + digest != file_proxy.readline().rstrip('\n'):
+                return None
+
+            return file_proxy.read()
+
+
+    def _write_sidecar(self, path, digest, text):
+
+        sidecar = self.sidecar(path)
+        tmp_path = sidecar.with_name(sidecar.name + '.tmp')
+
+        with open(tmp_path, 'w', encoding='utf-8') as file_proxy:
+            file_proxy.write(self.header + digest + '\n')
+            file_proxy.write(text)
+
+        os.replace(tmp_path, sidecar)
+
+
+    def page_ranges(self, path):
+
+        num_pages = self.executor.submit(_num_pages, str(path)).result()
+
+        if 0 == num_pages:
+            return []
+
+        #the first page is parsed alone, so a hit there costs one page, not a whole chunk.
+        starts = [0, *range(1, num_pages, self.pages_per_task)]
+
+        return list(zip(starts, starts[1:] + [num_pages]))
+
+
+    def iter_pages(self, path, read_all=False):
+
+        digest = file_hash(path)
+        text = self._read_sidecar(path, digest)
+
+        if text is not None: #page breaks are not kept in the sidecar
+            yield text
+            return
+
+        ranges = iter(self.page_ranges(path))
+        chunks = deque()
+        pages = []
+
+        #large pdfs are split so that their pages are parsed on several cores, but only a few
+        #chunks are in flight at once; a caller stopping early leaves the rest unsubmitted.
+        def submit(count):
+            for start, stop in islice(ranges, count):
+                chunks.append(self.executor.submit(_pages_text, str(path), start, stop))
+
+        try:
+            #a full read has nothing to stop early for, so it fans out across every core.
+            submit(None if read_all else self.in_flight)
+
+            while 0 < len(chunks):
+                for page in chunks.popleft().result():
+                    pages.append(page)
+                    yield page
+
+                #the next chunk is only submitted once the caller asks past this one.
+                submit(1)
+
+            #only a pdf read to the end is worth a sidecar.
+            self._write_sidecar(path, digest, ''.join(pages))
+
+        finally:
+            for chunk in chunks:
+                chunk.cancel()
+
+
+    def extract(self, path):
+        return ''.join(self.iter_pages(path, read_all=True))
+
+
+    def close(self):
+
+        self.executor.shutdown()
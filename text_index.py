@@ -0,0 +1,132 @@
+import re
+import sqlite3
+import threading
+
+from utils import regrex_accession_number
+
+
+regrex_term = re.compile(r"[a-z0-9]{2,}")
+
+
+def title_terms(title):
+    return set(regrex_term.findall(title.lower())) if isinstance(title, str) else set()
+
+
+class text_index():
+
+    fields = ['accession', 'pmid', 'title']
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS posting (
+            field TEXT NOT NULL,
+            term TEXT NOT NULL,
+            doi TEXT NOT NULL,
+            PRIMARY KEY (field, term, doi)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS posting_doi ON posting (doi, field)",
+        """CREATE TABLE IF NOT EXISTS document (
+            doi TEXT PRIMARY KEY,
+            digest TEXT
+        )""",
+    ]
+
+    def __init__(self, path):
+
+        self.path = path
+
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+        with self.connection:
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+
+    def add_publication(self, doi, pmid, title):
+
+        postings = [('title', term, doi) for term in title_terms(title)]
+
+        if isinstance(pmid, str):
+            postings.append(('pmid', pmid, doi))
+
+        with self._lock, self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO posting (field, term, doi) VALUES (?, ?, ?)", postings)
+
+
+    def add_text(self, doi, text, digest):
+
+        accessions = set(regrex_accession_number.findall(text))
+
+        #a replaced pdf drops the accessions of the old one.
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM posting WHERE doi = ? AND field = 'accession'", (doi,))
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO posting (field, term, doi) VALUES ('accession', ?, ?)",
+                [(accession, doi) for accession in accessions]
+            )
+            self.connection.execute("INSERT OR REPLACE INTO document (doi, digest) VALUES (?, ?)", (doi, digest))
+
+
+    def digest(self, doi):
+
+        with self._lock:
+            row = self.connection.execute("SELECT digest FROM document WHERE doi = ?", (doi,)).fetchone()
+
+        return None if row is None else row[0]
+
+
+    def has_text(self, doi):
+        return self.digest(doi) is not None
+
+
+    def dois_by(self, field, term):
+
+        if field not in self.fields:
+            raise AttributeError("Invalid index field.")
+
+        with self._lock:
+            rows = self.connection.execute("SELECT doi FROM posting WHERE field = ? AND term = ?", (field, term)).fetchall()
+
+        return [doi for doi, in rows]
+
+
+    def doi_by_pmid(self, pmid):
+
+        dois = self.dois_by('pmid', pmid)
+
+        return dois[0] if 0 < len(dois) else None
+
+
+    def mentions(self, doi, accessions):
+
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT 1 FROM posting WHERE field = 'accession' AND doi = ? AND term IN ({', '.join('?' * len(accessions))}) LIMIT 1",
+                (doi, *accessions)
+            ).fetchall()
+
+        return [] != rows
+
+
+    def search_title(self, query):
+
+        terms = title_terms(query)
+
+        if {*()} == terms:
+            return []
+
+        #dois holding every term of the query.
+        with self._lock:
+            rows = self.connection.execute(
+                f"""SELECT doi FROM posting WHERE field = 'title' AND term IN ({', '.join('?' * len(terms))})
+                GROUP BY doi HAVING COUNT(*) = ?""",
+                (*terms, len(terms))
+            ).fetchall()
+
+        return [doi for doi, in rows]
+
+
+    def close(self):
+        self.connection.close()
@@ -6,6 +6,7 @@ namespace_regrex = {'re': 'http://exslt.org/regular-expressions'}
 
 
 domain = "https://www.ncbi.nlm.nih.gov"
+eutils_base = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 gds_pubmed = "/pubmed?LinkName=gds_pubmed&from_uid=%s"#200044110
 
 
@@ -21,10 +22,48 @@ regrex_pmid_format = re.compile("^(?!.*[^\d]).+$")
 check_identifier = lambda regrex, identifier: bool(regrex.search(identifier))
 
 
+def chunked(iterable, size):
+
+    chunk = []
+
+    for item in iterable:
+        chunk.append(item)
+
+        if size == len(chunk):
+            yield chunk
+            chunk = []
+
+    if [] != chunk:
+        yield chunk
+
+
+def read_identifiers(path):
+
+    with open(path) as file_proxy:
+        for line in file_proxy:
+            if '' != line.strip():
+                yield line.strip()
+
+
 search_pubmed_by_pmid = "/pubmed/%s"
 search_pubmed_by_contributor = "/pubmed/?term=%s[Author]"
 search_pubmed_by_gds_uid = "/pubmed?LinkName=gds_pubmed&from_uid=%s"
 search_gds_by_uid = "/gds/?term=%s[uid]"
+pmc_article_by_pmid = "/pmc/articles/pmid/%s/"
+
+
+#seconds a cached page stays valid. pages not listed here never expire.
+cache_ttl = [
+    (r"/pubmed/?\?term=", 7 * 24 * 3600),
+    (r"/pubmed/?\?LinkName=", 30 * 24 * 3600),
+]
+
+
+#requests/s per host. NCBI allows 3, or 10 with an api key. hosts not listed here are not paced.
+host_rates = {
+    'www.ncbi.nlm.nih.gov': 3.,
+    'eutils.ncbi.nlm.nih.gov': 3.,
+}
 
 
 columns = {